@@ -0,0 +1,326 @@
+"""Headless batch solver.
+
+Solves every puzzle of the given files (one puzzle per line, the format of
+data/puzzle_*.txt) on a pool of worker processes and prints one CSV row or JSON
+line per puzzle as soon as it is done:
+
+    python src/batch.py data/*.txt --jobs 8 --timeout 30 --format json
+"""
+
+import argparse
+import contextlib
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from multiprocessing.connection import Connection, wait
+from typing import Iterable, Iterator, List
+
+from cache import DEFAULT_PATH, SolutionCache
+from portfolio import solve_portfolio
+from encoding import SHAPE_CACHE_ENV, shape_clauses
+from models import PuzzleSpec
+from repository import parse_puzzle
+from solver import MySolver, Statistics, Status
+
+TIMEOUT = 30
+# extra seconds a worker gets to stop on its own before it is killed
+KILL_GRACE = 1
+FIELDS = [
+    "path",
+    "index",
+    "size",
+    "hints",
+    "mode",
+    "status",
+    "time",
+    "variables",
+    "clauses",
+    "retried",
+    "cuts",
+    "presolved",
+    "backend",
+    "conflicts",
+    "decisions",
+    "propagations",
+    "solutions",
+    "cache_hits",
+]
+
+
+@dataclass
+class Task:
+    path: str
+    index: int
+    line: str
+    mode: str = "lazy"
+
+    @property
+    def shape(self):
+        rows, columns = [int(x) for x in self.line.split()[:2]]
+        return rows, columns
+
+
+@dataclass
+class Result:
+    path: str
+    index: int
+    mode: str
+    size: str = ""
+    hints: int = 0
+    # one of solver.Status, or error when the worker died
+    status: str = "error"
+    stats: Statistics = field(default_factory=Statistics)
+
+    @classmethod
+    def of(cls, task: Task, **kwargs) -> "Result":
+        rows, columns, *cells = [int(x) for x in task.line.split()]
+        return cls(
+            path=task.path,
+            index=task.index,
+            mode=task.mode,
+            size=f"{columns}x{rows}",
+            hints=sum(1 for x in cells if x >= 0),
+            **kwargs,
+        )
+
+    def row(self):
+        return {
+            "path": self.path,
+            "index": self.index,
+            "size": self.size,
+            "hints": self.hints,
+            "mode": self.mode,
+            "status": self.status,
+            "time": self.stats.acum_time,
+            "variables": self.stats.variables,
+            "clauses": self.stats.clauses,
+            "retried": self.stats.retried,
+            "cuts": self.stats.cuts,
+            "presolved": self.stats.presolved,
+            "backend": self.stats.backend,
+            "conflicts": self.stats.conflicts,
+            "decisions": self.stats.decisions,
+            "propagations": self.stats.propagations,
+            "solutions": self.stats.solutions,
+            "cache_hits": self.stats.cache_hits,
+        }
+
+
+def read_tasks(paths: Iterable[str], modes: List[str]) -> Iterator[Task]:
+    for path in paths:
+        with open(path, "r") as f:
+            for index, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                for mode in modes:
+                    yield Task(path, index, line, mode)
+
+
+def solve_task(
+    task: Task,
+    timeout: float = None,
+    portfolio: bool = False,
+    count: int = 0,
+    cache: str = None,
+) -> Result:
+    """With `count`, the answers are counted up to it instead of solving.
+
+    With `cache`, the path of a SolutionCache, known answers are taken from it and
+    new ones are added. Counting ignores it, and portfolio answers are not added.
+    """
+    board = parse_puzzle(task.line)
+    result = Result.of(task)
+    solutions = SolutionCache(cache) if cache and not count else None
+
+    if portfolio and not (solutions and PuzzleSpec.of(board) in solutions):
+        result.stats = solve_portfolio(board, mode=task.mode, timeout=timeout)
+    elif count:
+        solver = MySolver(board, mode=task.mode, timeout=timeout)
+        solver.count_solutions(count)
+        result.stats = solver.stats
+    else:
+        solver = MySolver(board, mode=task.mode, timeout=timeout, cache=solutions)
+        solver.solve()
+        result.stats = solver.stats
+    if solutions is not None:
+        solutions.close()
+
+    result.status = result.stats.status
+
+    return result
+
+
+def _worker(
+    conn: Connection,
+    task: Task,
+    timeout: float,
+    portfolio: bool,
+    count: int,
+    cache: str,
+):
+    try:
+        conn.send(solve_task(task, timeout, portfolio, count, cache))
+    finally:
+        conn.close()
+
+
+def run_batch(
+    tasks: Iterable[Task],
+    jobs: int = None,
+    timeout: float = TIMEOUT,
+    portfolio: bool = False,
+    count: int = 0,
+    cache: str = None,
+) -> Iterator[Result]:
+    """Yields results in completion order.
+
+    Every puzzle runs in its own worker process, at most `jobs` at a time. The
+    solver stops itself after `timeout` seconds, and a worker that is still
+    busy `KILL_GRACE` seconds later is killed. Forked workers get the shape
+    clauses of their board from this process, see encoding.shape_clauses.
+
+    With `portfolio`, each worker races the portfolio backends in processes of
+    its own, so workers can not be daemons then. With `count`, workers count
+    the answers up to it, see MySolver.count_solutions. With `cache`, workers
+    share the SolutionCache at that path.
+    """
+    jobs = jobs or os.cpu_count()
+    fork = multiprocessing.get_start_method() == "fork"
+    pending = deque(tasks)
+    running = {}
+
+    while pending or running:
+        while pending and len(running) < jobs:
+            task = pending.popleft()
+            if fork:
+                # the worker inherits the base clauses of the shape
+                shape_clauses(*task.shape)
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(
+                target=_worker,
+                args=(sender, task, timeout, portfolio, count, cache),
+                daemon=not portfolio,
+            )
+            process.start()
+            sender.close()
+            deadline = time.monotonic() + timeout + KILL_GRACE
+            running[receiver] = (process, task, deadline)
+
+        deadline = min(deadline for _, _, deadline in running.values())
+        ready = wait(list(running), timeout=max(0, deadline - time.monotonic()))
+
+        for conn in ready:
+            process, task, _ = running.pop(conn)
+            try:
+                result = conn.recv()
+            except EOFError:
+                # the worker died without an answer
+                result = Result.of(task)
+            conn.close()
+            process.join()
+
+            yield result
+
+        now = time.monotonic()
+        for conn, (process, task, deadline) in list(running.items()):
+            if deadline > now:
+                continue
+
+            process.kill()
+            process.join()
+            conn.close()
+            del running[conn]
+
+            yield Result.of(
+                task,
+                status=Status.TIMEOUT,
+                stats=Statistics(acum_time=timeout, status=Status.TIMEOUT),
+            )
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="+", help="puzzle files, one puzzle per line")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=os.cpu_count(), help="worker processes"
+    )
+    parser.add_argument(
+        "-t",
+        "--timeout",
+        type=float,
+        default=TIMEOUT,
+        help="seconds per puzzle before it is stopped",
+    )
+    parser.add_argument(
+        "-m",
+        "--mode",
+        action="append",
+        choices=MySolver.MODES,
+        help="solver mode, repeat to run several (default: lazy)",
+    )
+    parser.add_argument(
+        "-p",
+        "--portfolio",
+        action="store_true",
+        help="race several SAT backends on each puzzle",
+    )
+    parser.add_argument(
+        "-c",
+        "--count",
+        type=int,
+        default=0,
+        help="count the answers up to this, 2 checks that they are unique",
+    )
+    parser.add_argument(
+        "--shape-cache", help="directory to keep the clauses of each board shape"
+    )
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        const=str(DEFAULT_PATH),
+        help=f"reuse known answers from this file (default: {DEFAULT_PATH})",
+    )
+    parser.add_argument("-f", "--format", choices=["csv", "json"], default="csv")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+    if args.count and args.portfolio:
+        parser.error("--count does not work with --portfolio")
+
+    if args.shape_cache:
+        os.environ[SHAPE_CACHE_ENV] = args.shape_cache
+
+    tasks = read_tasks(args.files, args.mode or ["lazy"])
+    if args.output:
+        out = open(args.output, "w", newline="")
+    else:
+        out = contextlib.nullcontext(sys.stdout)
+
+    with out as out:
+        writer = csv.DictWriter(out, fieldnames=FIELDS)
+        if args.format == "csv":
+            writer.writeheader()
+
+        results = run_batch(
+            tasks,
+            jobs=args.jobs,
+            timeout=args.timeout,
+            portfolio=args.portfolio,
+            count=args.count,
+            cache=args.cache,
+        )
+        for result in results:
+            if args.format == "csv":
+                writer.writerow(result.row())
+            else:
+                out.write(json.dumps({**result.row(), "stats": asdict(result.stats)}))
+                out.write("\n")
+            out.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""Phase benchmark of the solver.
+
+Solves every puzzle of the given files (default: data/*.txt), plus synthetic
+boards of the given sizes, and times each phase of the solve separately: parse,
+then MySolver.PHASES. Each puzzle is solved `--warmup` times untimed, then
+`--repeat` times. The medians and percentiles of every phase go to a JSON report,
+per puzzle file and over all of them:
+
+    python src/benchmark.py --synthetic 50x50 80x80 -o bench.json
+    python src/benchmark.py --baseline bench.json --threshold 0.25
+
+With a baseline, the run fails when the median of a phase is more than
+`threshold` slower than in the baseline.
+
+With `--memory N`, it instead solves the puzzles round-robin N times, the way the
+animated UI does (reading the board after every model), and reports the resident
+memory along the way. It fails when memory keeps growing after the first round:
+
+    python src/benchmark.py "data/puzzle_15x15 hard.txt" --memory 500
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from glob import glob
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from repository import DB_DIR, parse_puzzle
+from solver import MySolver, Status
+
+PHASES = ["parse"] + MySolver.PHASES
+WARMUP = 1
+REPEAT = 5
+THRESHOLD = 0.25
+# phases faster than this (seconds) are too noisy to fail the run
+NOISE_FLOOR = 0.0005
+TIMEOUT = 30
+# resident memory allowed to grow after the first round of --memory, in MB
+MAX_GROWTH = 16
+
+
+def synthetic_puzzle(columns: int, rows: int, seed: int = 0) -> str:
+    """A puzzle line whose answer is the outline of a random histogram.
+
+    Every column j of cells is inside the loop up to a random height, which
+    always gives a single loop. Clues are the edge counts of the outline with
+    about a third of them hidden.
+    """
+    rng = random.Random(seed)
+    heights = [rng.randint(1, rows - 1) for _ in range(columns)]
+
+    def inside(i, j):
+        return 0 <= j < columns and 0 <= i < heights[j]
+
+    clues = []
+    for i in range(rows):
+        for j in range(columns):
+            neighbors = [(i - 1, j), (i + 1, j), (i, j - 1), (i, j + 1)]
+            value = sum(1 for x, y in neighbors if inside(x, y) != inside(i, j))
+            clues.append(value if rng.random() < 0.66 else -1)
+
+    return " ".join(str(x) for x in [rows, columns] + clues)
+
+
+def read_puzzles(paths: List[str], synthetic: List[str]) -> List[Tuple[str, str]]:
+    """(group, puzzle line) pairs, the group is the file name or the size."""
+    puzzles = []
+    for path in paths:
+        with open(path, "r") as f:
+            group = Path(path).stem
+            puzzles.extend((group, line) for line in f if line.strip())
+
+    for size in synthetic:
+        columns, rows = [int(x) for x in size.split("x")]
+        group = f"synthetic_{size}"
+        puzzles.extend(
+            (group, synthetic_puzzle(columns, rows, seed)) for seed in range(5)
+        )
+
+    return puzzles
+
+
+def time_solve(line: str, timeout: float) -> Dict[str, float]:
+    start = time.perf_counter()
+    board = parse_puzzle(line)
+    parse = time.perf_counter() - start
+
+    solver = MySolver(board, timeout=timeout)
+    solver.solve()
+    if solver.stats.status != Status.SOLVED:
+        raise RuntimeError(f"not solved ({solver.stats.status}): {line[:40]}...")
+
+    return {"parse": parse, **solver.stats.phases}
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    if len(samples) == 1:
+        samples = samples * 2
+    percentiles = statistics.quantiles(samples, n=100, method="inclusive")
+
+    return {
+        "median": statistics.median(samples),
+        "p90": percentiles[89],
+        "p99": percentiles[98],
+        "max": max(samples),
+        "total": sum(samples),
+    }
+
+
+def run(
+    puzzles: List[Tuple[str, str]],
+    warmup: int = WARMUP,
+    repeat: int = REPEAT,
+    timeout: float = TIMEOUT,
+) -> Dict:
+    samples = {"all": {phase: [] for phase in PHASES}}
+    for group, line in puzzles:
+        for _ in range(warmup):
+            time_solve(line, timeout)
+
+        group_samples = samples.setdefault(group, {phase: [] for phase in PHASES})
+        for _ in range(repeat):
+            phases = time_solve(line, timeout)
+            for phase in PHASES:
+                group_samples[phase].append(phases.get(phase, 0))
+                samples["all"][phase].append(phases.get(phase, 0))
+
+    return {
+        "python": platform.python_version(),
+        "warmup": warmup,
+        "repeat": repeat,
+        "puzzles": len(puzzles),
+        "groups": {
+            group: {phase: summarize(values) for phase, values in phases.items()}
+            for group, phases in samples.items()
+        },
+    }
+
+
+def rss() -> int:
+    """Resident memory of this process in bytes, 0 when unknown (not Linux)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def memory(puzzles: List[Tuple[str, str]], solves: int, timeout: float) -> Dict:
+    samples = []
+    every = max(1, len(puzzles))
+    for k in range(solves):
+        _, line = puzzles[k % len(puzzles)]
+        solver = MySolver(parse_puzzle(line), timeout=timeout)
+        solver.add_partial_solution_callback(lambda board, stats: board.graph)
+        solver.solve()
+
+        if (k + 1) % every == 0:
+            gc.collect()
+            samples.append(rss())
+
+    # the first round fills the shape caches
+    growth = samples[-1] - samples[0] if samples else 0
+
+    return {
+        "python": platform.python_version(),
+        "solves": solves,
+        "puzzles": len(puzzles),
+        "rss": samples,
+        "growth": growth,
+    }
+
+
+def regressions(report: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Phases whose median got slower than the baseline by more than `threshold`.
+
+    Only groups found in both are compared, "all" only when both runs had the
+    same puzzles.
+    """
+    found = []
+    for group, phases in report["groups"].items():
+        if group == "all" and report["puzzles"] != baseline["puzzles"]:
+            continue
+        for phase, summary in phases.items():
+            try:
+                before = baseline["groups"][group][phase]["median"]
+            except KeyError:
+                continue
+
+            now = summary["median"]
+            if now > before * (1 + threshold) and now - before > NOISE_FLOOR:
+                found.append(
+                    f"{group} {phase}: {before * 1000:.3f} ms -> {now * 1000:.3f} ms"
+                )
+
+    return found
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*", help=f"puzzle files (default: {DB_DIR}/*)")
+    parser.add_argument(
+        "-s", "--synthetic", nargs="*", default=[], help="sizes, e.g. 50x50"
+    )
+    parser.add_argument("-w", "--warmup", type=int, default=WARMUP)
+    parser.add_argument("-r", "--repeat", type=int, default=REPEAT)
+    parser.add_argument("-t", "--timeout", type=float, default=TIMEOUT)
+    parser.add_argument(
+        "-m", "--memory", type=int, help="measure memory over this many solves"
+    )
+    parser.add_argument(
+        "--max-growth",
+        type=float,
+        default=MAX_GROWTH,
+        help="MB of memory growth allowed with --memory",
+    )
+    parser.add_argument("-o", "--output", help="JSON report (default: stdout)")
+    parser.add_argument("-b", "--baseline", help="JSON report to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=THRESHOLD,
+        help="allowed slowdown of a median, 0.25 is 25%%",
+    )
+    args = parser.parse_args(argv)
+
+    paths = args.files or sorted(glob(f"{DB_DIR}/*.txt"))
+    puzzles = read_puzzles(paths, args.synthetic)
+    if args.memory:
+        report = memory(puzzles, args.memory, args.timeout)
+    else:
+        report = run(puzzles, args.warmup, args.repeat, args.timeout)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.memory and report["growth"] > args.max_growth * 2**20:
+        print(f"memory grew by {report['growth'] / 2**20:.1f} MB", file=sys.stderr)
+        return 1
+
+    if args.baseline and not args.memory:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        found = regressions(report, baseline, args.threshold)
+        for line in found:
+            print(f"regression: {line}", file=sys.stderr)
+        if found:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
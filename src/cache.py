@@ -0,0 +1,159 @@
+"""Solutions of solved puzzles, kept on disk across runs.
+
+Rotations and reflections of a puzzle share one answer: the key is the
+fingerprint of the canonical form (see symmetry.py), and the answer is stored as
+a bitmap of its edge ids on that form. The cache is a SQLite file in WAL mode,
+so several processes can read and write it at once. When the file grows over
+`max_bytes`, the least recently used answers are dropped, and SQLite reuses
+their pages.
+
+The default file is $SLITHERLINK_CACHE, or ~/.cache/slitherlink/solutions.sqlite.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import FrozenSet, Iterable
+
+from models import PuzzleSpec
+from symmetry import canonical, from_canonical, to_canonical
+
+CACHE_ENV = "SLITHERLINK_CACHE"
+DEFAULT_PATH = Path.home() / ".cache" / "slitherlink" / "solutions.sqlite"
+# bytes the file may use before answers are dropped
+MAX_BYTES = 64 * 2**20
+# share of the answers dropped at once when it is full
+EVICT = 0.1
+# seconds to wait for another process holding the write lock
+BUSY_TIMEOUT = 10
+# seconds a hit can leave the time of last use as is, a hit then costs no write
+USED_RESOLUTION = 60
+
+
+def pack_edges(edges: Iterable[int], edges_count: int) -> bytes:
+    """Edge ids as a bitmap, bit e - 1 is edge e."""
+    bits = bytearray((edges_count + 7) // 8)
+    for e in edges:
+        bits[(e - 1) >> 3] |= 1 << ((e - 1) & 7)
+
+    return bytes(bits)
+
+
+def unpack_edges(bits: bytes) -> FrozenSet[int]:
+    # the bitmap as a string of 0 and 1, edge 1 first
+    digits = bin(int.from_bytes(bits, "little"))[:1:-1]
+    edges = []
+    k = digits.find("1")
+    while k >= 0:
+        edges.append(k + 1)
+        k = digits.find("1", k + 1)
+
+    return frozenset(edges)
+
+
+class SolutionCache:
+    """Answers by puzzle, shared by the threads and processes using the file."""
+
+    def __init__(self, path: Path | str = None, max_bytes: int = MAX_BYTES):
+        self.path = Path(path or os.environ.get(CACHE_ENV) or DEFAULT_PATH)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = None
+        self._pid = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # a connection can not cross a fork, each process opens its own
+        if self._db is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(
+                self.path,
+                timeout=BUSY_TIMEOUT,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS solutions ("
+                " key BLOB PRIMARY KEY, edges BLOB NOT NULL, used REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS solutions_used ON solutions(used)")
+            self._db = db
+            self._pid = os.getpid()
+
+        return self._db
+
+    def get(self, spec: PuzzleSpec) -> FrozenSet[int] | None:
+        """The edge ids of the answer, None when it is not known."""
+        form, t = canonical(spec)
+        key = form.fingerprint
+        with self._lock:
+            db = self._connect()
+            row = db.execute(
+                "SELECT edges, used FROM solutions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            now = time.time()
+            if now - row[1] > USED_RESOLUTION:
+                db.execute("UPDATE solutions SET used = ? WHERE key = ?", (now, key))
+
+        return from_canonical(unpack_edges(row[0]), spec, t)
+
+    def __contains__(self, spec: PuzzleSpec) -> bool:
+        with self._lock:
+            db = self._connect()
+            row = db.execute(
+                "SELECT 1 FROM solutions WHERE key = ?",
+                (canonical(spec)[0].fingerprint,),
+            ).fetchone()
+
+        return row is not None
+
+    def put(self, spec: PuzzleSpec, edges: Iterable[int]):
+        form, t = canonical(spec)
+        edges_count = (spec.rows + 1) * spec.columns + (spec.columns + 1) * spec.rows
+        bits = pack_edges(to_canonical(edges, spec, t), edges_count)
+        with self._lock:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO solutions (key, edges, used) VALUES (?, ?, ?)",
+                (form.fingerprint, bits, time.time()),
+            )
+            if self._size(db) > self.max_bytes:
+                self._evict(db)
+
+    def _size(self, db: sqlite3.Connection) -> int:
+        """Bytes in use, the free pages of dropped answers do not count."""
+        pages = db.execute("PRAGMA page_count").fetchone()[0]
+        free = db.execute("PRAGMA freelist_count").fetchone()[0]
+        size = db.execute("PRAGMA page_size").fetchone()[0]
+
+        return (pages - free) * size
+
+    def _evict(self, db: sqlite3.Connection):
+        count = db.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+        db.execute(
+            "DELETE FROM solutions WHERE key IN"
+            " (SELECT key FROM solutions ORDER BY used LIMIT ?)",
+            (max(1, int(count * EVICT)),),
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return (
+                self._connect().execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+            )
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM solutions")
+
+    def close(self):
+        with self._lock:
+            if self._db is not None and self._pid == os.getpid():
+                self._db.close()
+            self._db = None
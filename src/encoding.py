@@ -0,0 +1,314 @@
+"""CNF of the cell, node and small loop rules.
+
+With NumPy installed, the clauses come in whole blocks: the edge ids of all cells
+(or nodes) are put in one grid and every clause of a rule is cut out of it at
+once. Without it, they are built cell by cell. Both give the same clauses in the
+same order.
+"""
+
+import os
+import pickle
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from models import Board
+
+# NumPy once imported, False without it, see _numpy
+np = None
+
+# board shapes whose base clauses are kept in memory
+SHAPE_CACHE_SIZE = 32
+# directory to also keep them on disk, e.g. across batch runs
+SHAPE_CACHE_ENV = "SLITHERLINK_SHAPE_CACHE"
+# bump when the node or small loop rules change, old files are then ignored
+SHAPE_CACHE_VERSION = 1
+
+
+def cell_clauses(board: Board) -> List[List[int]]:
+    """The clue of each cell, or at most three edges around a cell without one."""
+    wrong = set(board.clues) - CELL_RULES.keys()
+    if wrong:
+        raise ValueError(f"clues must be -1..3, got {sorted(wrong)}")
+    m = board.rows
+    n = board.columns
+
+    if _numpy():
+        i, j = np.indices((m, n)).reshape(2, -1)
+        edges = np.stack(
+            [
+                i * n + j + 1,
+                (i + 1) * n + j + 1,
+                (m + 1) * n + j * m + i + 1,
+                (m + 1) * n + (j + 1) * m + i + 1,
+            ],
+            axis=-1,
+        )
+        keys = np.frombuffer(board.clues, dtype=np.int8)
+        return _blocks(edges, keys, CELL_TEMPLATES)
+
+    clauses = []
+    for row in board.cells:
+        for cell in row:
+            rule = CELL_RULES[cell.value]
+            clauses.extend(rule(cell.top, cell.bottom, cell.left, cell.right))
+
+    return clauses
+
+
+def node_clauses(board: Board) -> List[List[int]]:
+    """Zero or two edges at each node, border nodes have fewer edges."""
+    m = board.rows
+    n = board.columns
+
+    if _numpy():
+        i, j = np.indices((m + 1, n + 1)).reshape(2, -1)
+        edges = np.stack(
+            [
+                np.where(i > 0, (m + 1) * n + j * m + i, 0),
+                np.where(j < n, i * n + j + 1, 0),
+                np.where(i < m, (m + 1) * n + j * m + i + 1, 0),
+                np.where(j > 0, i * n + j, 0),
+            ],
+            axis=-1,
+        )
+        # bit k is set when the k-th edge exists
+        keys = (edges != 0) @ np.array([1, 2, 4, 8])
+        return _blocks(edges, keys, NODE_TEMPLATES)
+
+    clauses = []
+    for row in board.nodes:
+        for node in row:
+            clauses.extend(zero_or_two(node.top, node.right, node.bottom, node.left))
+
+    return clauses
+
+
+def smalloop_clauses(board: Board) -> List[List[int]]:
+    """No loop around two cells side by side."""
+    m = board.rows
+    n = board.columns
+    if n < 2:
+        return []
+
+    if _numpy():
+        i, j = np.indices((m, n - 1))
+        clauses = np.stack(
+            [
+                i * n + j + 1,
+                (i + 1) * n + j + 1,
+                (m + 1) * n + j * m + i + 1,
+                i * n + j + 2,
+                (i + 1) * n + j + 2,
+                (m + 1) * n + (j + 2) * m + i + 1,
+            ],
+            axis=-1,
+        )
+        return (-clauses).reshape(-1, 6).tolist()
+
+    return [
+        [
+            -(i * n + j + 1),
+            -((i + 1) * n + j + 1),
+            -((m + 1) * n + j * m + i + 1),
+            -(i * n + j + 2),
+            -((i + 1) * n + j + 2),
+            -((m + 1) * n + (j + 2) * m + i + 1),
+        ]
+        for i in range(m)
+        for j in range(n - 1)
+    ]
+
+
+@lru_cache(maxsize=SHAPE_CACHE_SIZE)
+def shape_clauses(rows: int, columns: int) -> Tuple[List[List[int]], List[List[int]]]:
+    """Node and small loop clauses, they only depend on the shape of the board.
+
+    The lists are shared by every board of that shape, do not modify them.
+    """
+    directory = os.environ.get(SHAPE_CACHE_ENV)
+    path = None
+    if directory:
+        name = f"shape_{rows}x{columns}_v{SHAPE_CACHE_VERSION}.pickle"
+        path = Path(directory) / name
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+
+    board = Board(rows, columns, [-1] * (rows * columns))
+    clauses = (node_clauses(board), smalloop_clauses(board))
+
+    if path:
+        # several processes may write the same shape, each one renames a
+        # complete file of its own into place
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "wb") as f:
+                pickle.dump(clauses, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    return clauses
+
+
+def _numpy():
+    """Imports NumPy on the first encoding, it would double the start of the
+    command line tools."""
+    global np
+    if np is None:
+        try:
+            import numpy
+
+            np = numpy
+        except ImportError:
+            np = False
+
+    return np
+
+
+def _blocks(edges, keys, templates: Dict) -> List[List[int]]:
+    """Clauses of `templates[key]` over the edges of every item, item by item.
+
+    `edges` holds one row of edge ids per item. All items with the same key are
+    encoded at once, one clause of the template at a time, and the clauses are
+    put back in item order.
+    """
+    groups = {key: np.flatnonzero(keys == key) for key in np.unique(keys).tolist()}
+    counts = np.zeros(len(keys), dtype=np.int64)
+    for key, items in groups.items():
+        counts[items] = len(templates[key])
+    starts = np.cumsum(counts) - counts
+
+    clauses = np.empty(counts.sum(), dtype=object)
+    for key, items in groups.items():
+        block = edges[items]
+        for t, (columns, signs) in enumerate(templates[key]):
+            rows = (block[:, columns] * signs).tolist()
+            clauses[starts[items] + t] = np.fromiter(
+                rows, dtype=object, count=len(rows)
+            )
+
+    return clauses.tolist()
+
+
+def _template(clauses: List[List[int]]) -> List[Tuple[List[int], List[int]]]:
+    """Clauses over placeholders 1..4 as (columns, signs)."""
+    return [
+        ([abs(x) - 1 for x in clause], [1 if x > 0 else -1 for x in clause])
+        for clause in clauses
+    ]
+
+
+def zero(e1, e2, e3, e4):
+    """
+    All e1, e2, e3 and e4 must be false.
+    """
+    return [[-e1], [-e2], [-e3], [-e4]]
+
+
+def one(e1, e2, e3, e4):
+    """
+    The "exactly one" constraint can be expressed as
+    * Amongst any two of booleans, at least one must be false.
+    * Atleast one of the booleans is true.
+    """
+    return [
+        [-e1, -e2],
+        [-e1, -e3],
+        [-e1, -e4],
+        [-e2, -e3],
+        [-e2, -e4],
+        [-e3, -e4],
+        [e1, e2, e3, e4],
+    ]
+
+
+def two(e1, e2, e3, e4):
+    """
+    Amongst any three booleans, at least one must be true,
+    and atleast one must be false.
+    """
+    return [
+        [e2, e3, e4],
+        [e1, e3, e4],
+        [e1, e2, e4],
+        [e1, e2, e3],
+        [-e2, -e3, -e4],
+        [-e1, -e3, -e4],
+        [-e1, -e2, -e4],
+        [-e1, -e2, -e3],
+    ]
+
+
+def three(e1, e2, e3, e4):
+    """
+    Amongst any two booleans, at least one must be true. This ensures
+    that there are at least three true booleans.
+    Also add a clause that ensures at least one of them must be false.
+    Together they ensure the "exactly three correct"
+    """
+    return [
+        [e1, e2],
+        [e1, e3],
+        [e1, e4],
+        [e2, e3],
+        [e2, e4],
+        [e3, e4],
+        [-e1, -e2, -e3, -e4],
+    ]
+
+
+def at_most_three(e1, e2, e3, e4):
+    return [[-e1, -e2, -e3, -e4]]
+
+
+def zero_or_two(e1, e2, e3, e4):
+    true = sys.maxsize
+    false = -true
+    edges = []
+    for item in [e1, e2, e3, e4]:
+        if item == 0:
+            edges.append(false)
+        else:
+            edges.append(item)
+    e1, e2, e3, e4 = edges
+    generic_contraints = [
+        [-e1, -e2, -e3],
+        [-e1, -e2, -e4],
+        [-e1, -e3, -e4],
+        [-e2, -e3, -e4],
+        [-e1, e2, e3, e4],
+        [e1, -e2, e3, e4],
+        [e1, e2, -e3, e4],
+        [e1, e2, e3, -e4],
+    ]
+
+    contraints = []
+    for row in generic_contraints:
+        if true in row:
+            continue
+
+        contraints.append([x for x in row if x != false])
+
+    return contraints
+
+
+# clue -> rule of the cell, -1 is no clue
+CELL_RULES = {-1: at_most_three, 0: zero, 1: one, 2: two, 3: three}
+
+# clue -> clauses over the top, bottom, left and right edges of a cell
+CELL_TEMPLATES = {
+    value: _template(rule(1, 2, 3, 4)) for value, rule in CELL_RULES.items()
+}
+
+# bit k set when the k-th of the top, right, bottom and left edges exists ->
+# clauses of the node
+NODE_TEMPLATES = {
+    key: _template(zero_or_two(*[k + 1 if key >> k & 1 else 0 for k in range(4)]))
+    for key in range(16)
+}
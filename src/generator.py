@@ -1,15 +1,287 @@
 #!/usr/bin/python
+"""Puzzle generator.
 
-# Adapted from https://github.com/pinkston3/slitherlink/blob/master/get_puzzle.py
-from bs4 import BeautifulSoup
-import asyncio
-import aiofiles
-import aiohttp
+Grows a random loop, writes all its clues, then removes clues in random order
+as long as the answer stays unique. Puzzles are appended to
+data/puzzle_<columns>x<rows> <diff>.txt, one per line:
+
+    python src/generator.py 30x30 -n 100 --jobs 8 --difficulty hard
+
+A puzzle is "normal" when the presolver alone solves it, "hard" otherwise. With
+--difficulty normal only clues the presolver can do without are removed, hard
+puzzles come from also removing clues that take the SAT solver to rule out.
+
+--scrape downloads puzzles from puzzle-loop.com instead (needs bs4, aiohttp and
+aiofiles).
+"""
+
+import argparse
+import multiprocessing
+import random
+import time
+from typing import List, Set, Tuple
+
+from encoding import CELL_RULES, at_most_three, shape_clauses
+from models import Board
+from presolve import Presolver
+from repository import DB_DIR
+from solver import MySolver
 
 URL = "http://www.puzzle-loop.com"
+DIFFICULTY = ["normal", "hard"]
+# share of the cells inside the loop, picked at random in this range
+FILL = (0.35, 0.6)
+# SAT calls allowed per uniqueness question, the clue is kept when they run out
+ROUNDS = 10
+
+
+def random_region(rows: int, columns: int, rng: random.Random) -> Set[int]:
+    """Cells (row-major index) of a random region whose outline is a single loop.
+
+    The region starts from one cell and grows one neighbor at a time. A cell is
+    only added when the cells inside and outside around it stay in one piece each,
+    and no two cells inside touch only by a corner, so the region never gets a
+    hole or a pinch.
+    """
+    m = rows
+    n = columns
+
+    def inside(i, j):
+        return 0 <= i < m and 0 <= j < n and i * n + j in region
+
+    # the 8 cells around one, in order around it
+    ring = [(-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1)]
+
+    def can_add(i, j):
+        around = [inside(i + di, j + dj) for di, dj in ring]
+        # corner cells touching (i, j) only by a corner
+        for k in range(0, 8, 2):
+            if around[k] and not around[k - 1] and not around[k + 1]:
+                return False
+        # one run of inside cells around it
+        runs = sum(1 for k in range(8) if around[k] and not around[k - 1])
+        return runs == 1
+
+    target = int(m * n * rng.uniform(*FILL))
+    start = rng.randrange(m * n)
+    region = {start}
+    frontier = set()
+
+    def grow(cell):
+        i, j = divmod(cell, n)
+        for x, y in [(i - 1, j), (i + 1, j), (i, j - 1), (i, j + 1)]:
+            if 0 <= x < m and 0 <= y < n and x * n + y not in region:
+                frontier.add(x * n + y)
+
+    grow(start)
+    while len(region) < target and frontier:
+        cell = rng.choice(sorted(frontier))
+        frontier.discard(cell)
+        if can_add(*divmod(cell, n)):
+            region.add(cell)
+            grow(cell)
+
+    return region
+
+
+def outline(rows: int, columns: int, region: Set[int]) -> Tuple[List[int], List[int]]:
+    """The clue of every cell and the edge ids of the loop around `region`."""
+    m = rows
+    n = columns
+
+    def inside(i, j):
+        return 0 <= i < m and 0 <= j < n and i * n + j in region
+
+    clues = []
+    edges = []
+    for i in range(m):
+        for j in range(n):
+            sides = [
+                (i - 1, j, i * n + j + 1),
+                (i + 1, j, (i + 1) * n + j + 1),
+                (i, j - 1, (m + 1) * n + j * m + i + 1),
+                (i, j + 1, (m + 1) * n + (j + 1) * m + i + 1),
+            ]
+            loop = [e for x, y, e in sides if inside(x, y) != inside(i, j)]
+            clues.append(len(loop))
+            if inside(i, j):
+                edges.extend(loop)
+
+    return clues, edges
+
+
+class UniquenessChecker:
+    """Tells whether a subset of the clues still has only the known answer.
+
+    One SAT solver is kept for all the questions. The rules of each clue are
+    guarded by a selector variable, the subset is given as assumptions, and the
+    known answer is blocked. Loops found on the way are cut like in MySolver, but
+    every cut is guarded by the selector of a clue that it relies on, so it stays
+    right when that clue is removed later.
+    """
+
+    def __init__(self, board: Board, clues: List[int], answer: List[int]):
+        from pysat.solvers import Solver
+
+        self.board = board
+        self.clues = clues
+        self.helper = MySolver(board)
+        self.helper.assign_edges_index()
+        self.edges_count = board.edges_count
+        self.selectors = [self.edges_count + 1 + k for k in range(len(clues))]
+        self.helper.top_var = self.edges_count + len(clues)
+        self.cell_edges = [
+            (cell.top, cell.bottom, cell.left, cell.right)
+            for row in board.cells
+            for cell in row
+        ]
+
+        nodes, smalloops = shape_clauses(board.rows, board.columns)
+        contraints = nodes + smalloops
+        for edges, value, selector in zip(self.cell_edges, clues, self.selectors):
+            contraints.extend(at_most_three(*edges))
+            contraints.extend(
+                clause + [-selector] for clause in CELL_RULES[value](*edges)
+            )
+        contraints.append([-e for e in answer])
+
+        self.solver = Solver("g4", bootstrap_with=contraints)
+
+    def unique(self, active: List[int], rounds: int = ROUNDS) -> bool:
+        """Whether the clues of `active` only have the known answer.
 
+        Cuts are guarded by the first clue of `active` they can use, so the
+        clues least likely to be removed later should come first. After `rounds`
+        SAT calls without an answer, it gives up and says no.
+        """
+        selected = set(active)
+        assumptions = [s if k in selected else -s for k, s in enumerate(self.selectors)]
+        for _ in range(rounds):
+            if not self.solver.solve(assumptions=assumptions):
+                return True
 
-async def make_request(session: aiohttp.ClientSession, diff: str):
+            model = self.solver.get_model()
+            edges = frozenset(x for x in model[: self.edges_count] if x > 0)
+            loops = self.helper.extract_loops(edges)
+            if len(loops) == 1:
+                return False
+
+            for loop in loops:
+                cuts = self._cuts(set(loop), edges, active)
+                if not cuts:
+                    # this loop alone is another answer
+                    return False
+                self.solver.append_formula(cuts)
+
+        return False
+
+    def _cuts(self, loop, edges, active):
+        inner = self.helper._inner_edges(loop)
+        clues = self.clues
+        cell_edges = self.cell_edges
+
+        # a positive clue without edges between the loop's nodes: an answer that
+        # uses one of those edges must leave the nodes
+        for k in active:
+            if clues[k] > 0 and inner.isdisjoint(cell_edges[k]):
+                break
+        else:
+            own = inner & edges
+            wrong = [
+                k for k in active if sum(e in own for e in cell_edges[k]) != clues[k]
+            ]
+            if not wrong:
+                return []
+            return [[-self.selectors[wrong[0]]] + [-e for e in sorted(own)]]
+
+        around = self.board.node_edges
+        ends = self.board.edge_ends
+        boundary = sorted(
+            e
+            for v in loop
+            for e in around[4 * v : 4 * v + 4]
+            if e and ends[2 * e] + ends[2 * e + 1] - v not in loop
+        )
+        used = self.helper._new_var()
+
+        return [[-self.selectors[k], -used] + boundary] + [
+            [-e, used] for e in sorted(inner)
+        ]
+
+    def close(self):
+        self.solver.delete()
+
+
+def presolved(rows: int, columns: int, clues: List[int]) -> bool:
+    board = Board(rows, columns, clues)
+    presolver = Presolver(board)
+    presolver.run()
+    return presolver.solved
+
+
+def generate(rows: int, columns: int, difficulty: str, seed: int) -> Tuple[str, str]:
+    """A unique puzzle line and its difficulty.
+
+    Clues are removed in blocks: a block twice as big follows a removed one, and
+    half as big a kept one. Clues are only kept one by one, so each kept clue was
+    needed when it was tried, and stays needed as others go.
+    """
+    rng = random.Random(seed)
+    region = random_region(rows, columns, rng)
+    clues, answer = outline(rows, columns, region)
+    board = Board(rows, columns, clues)
+    checker = UniquenessChecker(board, clues, answer)
+
+    order = list(range(rows * columns))
+    rng.shuffle(order)
+    kept = []
+    t = 0
+    size = 1
+    try:
+        while t < len(order):
+            # kept clues stay, the others go in reverse order of their turn
+            ranking = kept + order[: t + size - 1 : -1]
+            active = set(ranking)
+            puzzle = [x if k in active else -1 for k, x in enumerate(clues)]
+            if presolved(rows, columns, puzzle) or (
+                difficulty == "hard" and checker.unique(ranking)
+            ):
+                t += size
+                size *= 2
+            elif size > 1:
+                size //= 2
+            else:
+                kept.append(order[t])
+                t += 1
+            size = min(size, len(order) - t) or 1
+    finally:
+        checker.close()
+
+    active = set(kept)
+    puzzle = [x if k in active else -1 for k, x in enumerate(clues)]
+    found = "normal" if presolved(rows, columns, puzzle) else "hard"
+
+    return " ".join(str(x) for x in [rows, columns] + puzzle), found
+
+
+def _generate(args) -> Tuple[str, str]:
+    return generate(*args)
+
+
+def generate_many(
+    size: str, count: int, difficulty: str, jobs: int = None, seed: int = None
+):
+    """Yields (puzzle line, difficulty) as the worker processes finish them."""
+    columns, rows = [int(x) for x in size.split("x")]
+    base = seed if seed is not None else random.randrange(2**32)
+    tasks = [(rows, columns, difficulty, base + k) for k in range(count)]
+
+    with multiprocessing.Pool(jobs) as pool:
+        yield from pool.imap_unordered(_generate, tasks)
+
+
+# Adapted from https://github.com/pinkston3/slitherlink/blob/master/get_puzzle.py
+async def make_request(session, diff: str):
     async with session.get(URL, params={"size": diff, "v": 0}) as resp:
         content = await resp.text()
         puzzle = parse_puzzle(content)
@@ -21,6 +293,8 @@ def parse_puzzle(text: str) -> str:
     """
     Get the puzzle from the given page.
     """
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(text, "lxml")
     puzzle_table = soup.find("table", id="LoopTable")
 
@@ -85,17 +359,51 @@ difficulty_map = {
 }
 
 
-async def main():
+async def scrape():
+    import aiofiles
+    import aiohttp
+
     async with aiohttp.ClientSession() as session:
         # difficulties = [4, 10, 11, 1, 5, 2, 6, 3, 7, 8, 9]
         for dif, name in difficulty_map.items():
-            async with aiofiles.open(f"data/puzzle_{name}.txt", "w") as f:
+            async with aiofiles.open(f"{DB_DIR}/puzzle_{name}.txt", "w") as f:
                 for _ in range(10):
                     p = await make_request(session, dif)
                     print(p)
                     await f.write(p + "\n")
 
 
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("size", nargs="?", help="columns x rows, e.g. 30x30")
+    parser.add_argument("-n", "--count", type=int, default=10)
+    parser.add_argument("-d", "--difficulty", choices=DIFFICULTY, default="hard")
+    parser.add_argument("-j", "--jobs", type=int, help="worker processes")
+    parser.add_argument("-s", "--seed", type=int, help="for repeatable puzzles")
+    parser.add_argument("-o", "--output", default=DB_DIR, help="puzzle directory")
+    parser.add_argument(
+        "--scrape", action="store_true", help="download from puzzle-loop.com"
+    )
+    args = parser.parse_args(argv)
+
+    if args.scrape:
+        import asyncio
+
+        asyncio.run(scrape())
+        return
+    if not args.size:
+        parser.error("the size is required")
+
+    start = time.perf_counter()
+    puzzles = generate_many(
+        args.size, args.count, args.difficulty, args.jobs, args.seed
+    )
+    for done, (line, diff) in enumerate(puzzles, start=1):
+        with open(f"{args.output}/puzzle_{args.size} {diff}.txt", "a") as f:
+            f.write(line + "\n")
+        elapsed = time.perf_counter() - start
+        print(f"{done}/{args.count} {diff} {elapsed:.1f}s", flush=True)
+
+
 if __name__ == "__main__":
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(main())
+    main()
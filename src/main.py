@@ -1,6 +1,7 @@
 from views import Window
 from viewmodels import BoardViewModel
 from repository import BoardRepository
+from cache import SolutionCache
 
 DB_PATH = "puzzles.txt"
 
@@ -10,7 +11,7 @@ class Application:
         # board = sample_board()
         self.repository = BoardRepository()
 
-        self.board_viewmodel = BoardViewModel(self.repository)
+        self.board_viewmodel = BoardViewModel(self.repository, cache=SolutionCache())
         self.window = Window((1200, 800), self.board_viewmodel)
 
     def run(self) -> None:
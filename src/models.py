@@ -1,10 +1,12 @@
-from copy import deepcopy
-from dataclasses import dataclass
-from typing import List, DefaultDict, FrozenSet
+from array import array
 from collections import defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+from hashlib import blake2b
+from typing import DefaultDict, FrozenSet, Iterable, List, Tuple
 
 
-@dataclass
+@dataclass(slots=True)
 class Cell:
     value: int
     row: int
@@ -19,35 +21,11 @@ class Cell:
     def edges(self) -> FrozenSet[int]:
         return frozenset([self.top, self.bottom, self.left, self.right])
 
-    def __copy__(self):
-        # Create a new instance of the Cell class with the same values
-        return Cell(
-            value=self.value,
-            top=self.top,
-            bottom=self.bottom,
-            left=self.left,
-            right=self.right,
-            row=self.row,
-            column=self.column,
-        )
-
     def __hash__(self):
         return self.row * 31 + self.column
 
-    def __deepcopy__(self, memo):
-        # Create a deep copy of the Cell class
-        return Cell(
-            value=deepcopy(self.value, memo),
-            top=deepcopy(self.top, memo),
-            bottom=deepcopy(self.bottom, memo),
-            left=deepcopy(self.left, memo),
-            right=deepcopy(self.right, memo),
-            row=deepcopy(self.row),
-            column=deepcopy(self.column),
-        )
-
 
-@dataclass
+@dataclass(slots=True)
 class Node:
     row: int
     column: int
@@ -57,13 +35,11 @@ class Node:
     left: int = 0
     right: int = 0
 
-    _hash: int = 0
+    # row * (columns + 1) + column, unique on its board
+    id: int = 0
 
     def __hash__(self):
-        if self._hash == 0:
-            self._hash = self.row * 31 + self.column + 1
-
-        return self._hash
+        return self.id
 
     def __eq__(self, other):
         if self is other:
@@ -71,69 +47,268 @@ class Node:
         else:
             return self.column == other.column and self.row == other.row
 
-    def __copy__(self):
-        # Create a new instance of the Node class with the same values
-        return Node(
-            row=self.row,
-            column=self.column,
-            top=self.top,
-            bottom=self.bottom,
-            left=self.left,
-            right=self.right,
-        )
-
-    def __deepcopy__(self, memo):
-        # Create a deep copy of the Node class
-        return Node(
-            row=deepcopy(self.row, memo),
-            column=deepcopy(self.column, memo),
-            top=deepcopy(self.top, memo),
-            bottom=deepcopy(self.bottom, memo),
-            left=deepcopy(self.left, memo),
-            right=deepcopy(self.right, memo),
-        )
-
-
-@dataclass
+
+@dataclass(slots=True)
 class Edge:
     src: Node
     dest: Node
 
 
+@dataclass(frozen=True, slots=True)
+class PuzzleSpec:
+    """The clues of a puzzle, immutable and hashable.
+
+    Specs are what the repository hands out, they can be shared by threads and
+    processes. Every solve gets its own Board from `to_board`.
+    """
+
+    rows: int
+    columns: int
+    # row by row, one signed byte per cell, -1 for no clue
+    clues: bytes
+
+    @classmethod
+    def parse(cls, line: str) -> "PuzzleSpec":
+        """One puzzle per line: rows, columns, then the cells row by row."""
+        rows, columns, *cells = [int(x) for x in line.split()]
+
+        return cls(rows, columns, array("b", cells).tobytes())
+
+    @classmethod
+    def of(cls, board: "Board") -> "PuzzleSpec":
+        return cls(board.rows, board.columns, board.clues.tobytes())
+
+    @property
+    def hints(self) -> int:
+        return sum(1 for x in self.clues if x < 0x80)
+
+    @property
+    def fingerprint(self) -> bytes:
+        """Stable across runs and machines, unlike hash()."""
+        shape = self.rows.to_bytes(4, "little") + self.columns.to_bytes(4, "little")
+        return blake2b(shape + self.clues, digest_size=16).digest()
+
+    def to_board(self) -> "Board":
+        # array("b", bytes) reads the bytes as signed
+        return Board(self.rows, self.columns, self.clues)
+
+    def line(self) -> str:
+        cells = array("b", self.clues).tolist()
+        return " ".join(str(x) for x in [self.rows, self.columns] + cells)
+
+
 class Board:
     """This class represents a Sitherlink Board.
     The board is a grid of points. This points can be connected by edges.
     The grid create rowsxcolumns cells.
+
+    The clues are kept row by row in a flat `array("b")`, -1 for no clue, and the
+    answer as one byte per edge id (1 when the edge is in the loop). `cells`,
+    `nodes` and `graph` are views built from them on first use.
+
+    Nodes are also numbered row by row, node id = row * (columns + 1) + column.
+    `node_edges`, `edge_ends` and `links` give the grid and the answer over ids.
     """
 
+    __slots__ = (
+        "rows",
+        "columns",
+        "clues",
+        "edges",
+        "solved",
+        "_cells",
+        "_nodes",
+        "_links",
+        "_graph",
+    )
+
     rows: int
     columns: int
-    nodes: List[List[Node]]
-    cells: List[List[Cell]]
-    graph: DefaultDict[Node, List[Node]]
-
-    def __init__(
-        self,
-        rows: int,
-        columns: int,
-        cells: List[List[Cell]] = [],
-    ):
-        assert rows == len(cells)
-        assert columns == len(cells[0])
+    clues: array
+    edges: bytearray
 
+    def __init__(self, rows: int, columns: int, clues: Iterable[int] = ()):
         self.rows = rows
         self.columns = columns
-        self.cells = cells
-        self.graph = defaultdict(list)
-        self.nodes = [[Node(i, j) for j in range(columns + 1)] for i in range(rows + 1)]
+        self.clues = array("b", clues)
+        assert len(self.clues) == rows * columns
+
+        self.edges = bytearray(self.edges_count + 1)
+        self.solved = False
+        self._cells = None
+        self._nodes = None
+        self._links = None
+        self._graph = None
+
+    @property
+    def edges_count(self) -> int:
+        """Edge ids take 1..(m+1)n+(n+1)m."""
+        m = self.rows
+        n = self.columns
+        return (m + 1) * n + (n + 1) * m
+
+    @property
+    def hints(self) -> int:
+        return sum(1 for x in self.clues if x >= 0)
+
+    @property
+    def cells(self) -> List[List[Cell]]:
+        if self._cells is None:
+            m = self.rows
+            n = self.columns
+            self._cells = [
+                [
+                    Cell(
+                        value=self.clues[i * n + j],
+                        row=i,
+                        column=j,
+                        top=i * n + j + 1,
+                        bottom=(i + 1) * n + j + 1,
+                        left=(m + 1) * n + j * m + i + 1,
+                        right=(m + 1) * n + (j + 1) * m + i + 1,
+                    )
+                    for j in range(n)
+                ]
+                for i in range(m)
+            ]
+
+        return self._cells
+
+    @property
+    def nodes(self) -> List[List[Node]]:
+        if self._nodes is None:
+            self._nodes = node_grid(self.rows, self.columns)
+
+        return self._nodes
+
+    @property
+    def node_edges(self) -> array:
+        """Edge ids around each node id, see shape_tables."""
+        return shape_tables(self.rows, self.columns)[0]
+
+    @property
+    def edge_ends(self) -> array:
+        """Node ids at both ends of each edge id, see shape_tables."""
+        return shape_tables(self.rows, self.columns)[1]
+
+    @property
+    def links(self) -> array:
+        """The answer as the two neighbors of each node id, -1 when unused."""
+        if self._links is None:
+            ends = self.edge_ends
+            links = array("i", [-1]) * (2 * (self.rows + 1) * (self.columns + 1))
+            for e in range(1, self.edges_count + 1):
+                if not self.edges[e]:
+                    continue
+
+                a, b = ends[2 * e], ends[2 * e + 1]
+                links[2 * a + (links[2 * a] >= 0)] = b
+                links[2 * b + (links[2 * b] >= 0)] = a
+            self._links = links
+
+        return self._links
+
+    @property
+    def graph(self) -> DefaultDict[Node, List[Node]]:
+        """The answer as the neighbors of each node in the loop."""
+        if self._graph is None:
+            nodes = [node for row in self.nodes for node in row]
+            links = self.links
+            graph = defaultdict(list)
+            for v, node in enumerate(nodes):
+                graph[node].extend(nodes[w] for w in links[2 * v : 2 * v + 2] if w >= 0)
+            self._graph = graph
+
+        return self._graph
+
+    def set_solution(self, edges: Iterable[int]):
+        """Replaces the answer with the given edge ids."""
+        self.edges = bytearray(self.edges_count + 1)
+        for e in edges:
+            self.edges[e] = 1
+        self._links = None
+        self._graph = None
+
+    def update_solution(self, added: Iterable[int], removed: Iterable[int]):
+        """Changes only the given edges of the answer."""
+        for e in removed:
+            self.edges[e] = 0
+        for e in added:
+            self.edges[e] = 1
+        self._links = None
+        self._graph = None
+
+    def clear_solution(self):
+        self.edges = bytearray(self.edges_count + 1)
         self.solved = False
-        self.hints = sum(
-            1 for cell_row in cells for cell in cell_row if cell.value >= 0
-        )
+        self._links = None
+        self._graph = None
 
     def deep_copy(self):
-        cells = deepcopy(self.cells)
-        # Create a new instance of the Board class
-        new_board = Board(rows=self.rows, columns=self.columns, cells=cells)
+        """A copy of the clues and the answer, the views are rebuilt lazily."""
+        new_board = Board.__new__(Board)
+        new_board.__setstate__(self.__getstate__())
+        new_board.clues = self.clues[:]
+        new_board.edges = self.edges[:]
 
         return new_board
+
+    def __getstate__(self):
+        # the views are cheap to rebuild, do not pickle them
+        return (self.rows, self.columns, self.clues, self.edges, self.solved)
+
+    def __setstate__(self, state):
+        self.rows, self.columns, self.clues, self.edges, self.solved = state
+        self._cells = None
+        self._nodes = None
+        self._links = None
+        self._graph = None
+
+
+@lru_cache(maxsize=32)
+def node_grid(rows: int, columns: int) -> List[List[Node]]:
+    """Nodes with their edge ids, shared by all boards of the same shape."""
+    m = rows
+    n = columns
+
+    return [
+        [
+            Node(
+                row=i,
+                column=j,
+                left=i * n + j if j > 0 else 0,
+                right=i * n + j + 1 if j < n else 0,
+                top=(m + 1) * n + j * m + i if i > 0 else 0,
+                bottom=(m + 1) * n + j * m + i + 1 if i < m else 0,
+                id=i * (n + 1) + j,
+            )
+            for j in range(n + 1)
+        ]
+        for i in range(m + 1)
+    ]
+
+
+@lru_cache(maxsize=32)
+def shape_tables(rows: int, columns: int) -> Tuple[array, array]:
+    """Flat grid tables over node ids, shared by all boards of the same shape.
+
+    The first holds the top, right, bottom and left edge ids of node v at
+    4v..4v+3, 0 for no edge. The second holds the node ids at both ends of edge e
+    at 2e and 2e+1, left to right or top to bottom.
+    """
+    m = rows
+    n = columns
+    around = array("i")
+    for row in node_grid(rows, columns):
+        for node in row:
+            around.extend([node.top, node.right, node.bottom, node.left])
+
+    ends = array("i", [0, 0])
+    for i in range(m + 1):
+        for j in range(n):
+            ends.extend([i * (n + 1) + j, i * (n + 1) + j + 1])
+    for j in range(n + 1):
+        for i in range(m):
+            ends.extend([i * (n + 1) + j, (i + 1) * (n + 1) + j])
+
+    return around, ends
@@ -0,0 +1,109 @@
+"""Portfolio solving: the same puzzle on several SAT backends at once.
+
+Every configuration runs in its own process, the first one that finds the
+single loop wins and the others are killed. The winner is recorded in
+Statistics.backend.
+"""
+
+import multiprocessing
+import threading
+import time
+from multiprocessing.connection import Connection, wait
+from typing import Dict, List
+
+from models import Board
+from solver import WATCHDOG_INTERVAL, MySolver, Statistics, Status
+
+# keyword arguments of MySolver, phase False prefers edges off
+PORTFOLIO = [
+    {"backend": "g4"},
+    {"backend": "cd19"},
+    {"backend": "m22"},
+    {"backend": "lgl"},
+    {"backend": "g4", "phase": False},
+    {"backend": "cd19", "phase": False},
+]
+
+
+def _worker(conn: Connection, board: Board, mode: str, config: Dict):
+    # no timeout of its own, lgl could not keep it, the parent kills it in time
+    try:
+        solver = MySolver(board, mode=mode, **config)
+        solver.solve()
+        conn.send((sorted(solver.solution), solver.stats))
+    except Exception as error:
+        # e.g. an unknown backend name, the parent counts it as failed
+        conn.send((None, f"{config}: {error!r}"))
+    finally:
+        conn.close()
+
+
+def solve_portfolio(
+    board: Board,
+    mode: str = "lazy",
+    configs: List[Dict] = PORTFOLIO,
+    timeout: float = None,
+    cancel_event: threading.Event = None,
+) -> Statistics:
+    """Solves `board` in place and returns the statistics of the winner.
+
+    Without a solved answer, the returned statistics are the last ones that came
+    in (e.g. unsolvable), or carry the cancelled / timeout status. Raises
+    RuntimeError when every worker failed without sending any.
+    """
+    deadline = time.monotonic() + timeout if timeout else None
+    running = {}
+    for config in configs:
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(
+            target=_worker, args=(sender, board, mode, config), daemon=True
+        )
+        process.start()
+        sender.close()
+        running[receiver] = process
+
+    stats = None
+    edges = None
+    errors = []
+    try:
+        while running and edges is None:
+            if cancel_event and cancel_event.is_set():
+                stats = Statistics(status=Status.CANCELLED)
+                break
+            if deadline and time.monotonic() >= deadline:
+                stats = Statistics(acum_time=timeout, status=Status.TIMEOUT)
+                break
+
+            for conn in wait(list(running), timeout=WATCHDOG_INTERVAL):
+                process = running.pop(conn)
+                # receive before joining, a child whose answer does not fit in the
+                # pipe only exits once it was read
+                try:
+                    answer, result = conn.recv()
+                except EOFError:
+                    process.join()
+                    errors.append(f"exit code {process.exitcode}")
+                    continue
+                finally:
+                    conn.close()
+                process.join()
+
+                if answer is None:
+                    errors.append(result)
+                    continue
+                stats = result
+                if result.status == Status.SOLVED:
+                    edges = answer
+                    break
+    finally:
+        for conn, process in running.items():
+            process.kill()
+            process.join()
+            conn.close()
+
+    if edges is not None:
+        MySolver(board, mode=mode).load_solution(edges)
+    if stats is None:
+        raise RuntimeError("every portfolio worker failed: " + "; ".join(errors))
+
+    return stats
@@ -0,0 +1,294 @@
+from typing import List
+from models import Board
+
+UNKNOWN = 0
+ON = 1
+OFF = -1
+
+
+class Contradiction(Exception):
+    pass
+
+
+class Presolver:
+    """Fixes edges with Slitherlink deductions before the SAT call.
+
+    The board must have its edge indexes assigned. Each pass applies the cell,
+    node and small loop rules around the edges fixed by the previous pass, and
+    the loop closing rules when those are stuck. Passes repeat until one fixes
+    nothing.
+
+    Like the CNF of the solver, it rejects a loop around a single cell and one
+    around two cells side by side, so both agree on such boards.
+    """
+
+    def __init__(self, board: Board):
+        m = board.rows
+        n = board.columns
+
+        self.board = board
+        self.state = [UNKNOWN] * ((m + 1) * n + (n + 1) * m + 1)
+        self.fixed = 0
+        self.changed: List[int] = []
+        self.passes: List[int] = []
+        self.contradiction = False
+
+        self.cells = [
+            (cell.value, [cell.top, cell.right, cell.bottom, cell.left])
+            for row in board.cells
+            for cell in row
+            if cell.value >= 0
+        ]
+        self.nodes = [
+            [e for e in [node.top, node.right, node.bottom, node.left] if e]
+            for row in board.nodes
+            for node in row
+        ]
+        # the two nodes (row-major index) at the ends of each edge
+        self.ends = [(0, 0)] * len(self.state)
+        for i, row in enumerate(board.nodes):
+            for j, node in enumerate(row):
+                if node.right:
+                    self.ends[node.right] = (i * (n + 1) + j, i * (n + 1) + j + 1)
+                if node.bottom:
+                    self.ends[node.bottom] = (i * (n + 1) + j, (i + 1) * (n + 1) + j)
+
+        # clue cells next to each edge
+        self.sides = [[] for _ in self.state]
+        for k, (_, edges) in enumerate(self.cells):
+            for e in edges:
+                self.sides[e].append(k)
+
+        # edges of the loops the CNF forbids, see encoding.cell_clauses (no clue:
+        # at most three edges) and encoding.smalloop_clauses
+        self.small = [
+            [cell.top, cell.right, cell.bottom, cell.left]
+            for row in board.cells
+            for cell in row
+            if cell.value < 0
+        ]
+        self.small += [
+            [a.top, a.bottom, a.left, b.top, b.bottom, b.right]
+            for row in board.cells
+            for a, b in zip(row, row[1:])
+        ]
+        self.small_sides = [[] for _ in self.state]
+        for k, edges in enumerate(self.small):
+            for e in edges:
+                self.small_sides[e].append(k)
+
+    @property
+    def solved(self) -> bool:
+        return not self.contradiction and self.fixed == len(self.state) - 1
+
+    def literals(self) -> List[int]:
+        return [e * s for e, s in enumerate(self.state) if s != UNKNOWN]
+
+    def run(self) -> List[int]:
+        """Fixed edges as literals, positive ones are in the loop."""
+        try:
+            self._patterns()
+            cells = range(len(self.cells))
+            nodes = range(len(self.nodes))
+            small = range(len(self.small))
+            while True:
+                before = self.fixed
+                self.changed = []
+                self._cell_rules(cells)
+                self._node_rules(nodes)
+                self._small_loop_rules(small)
+                if self.fixed == before:
+                    self._loop_rules()
+                self.passes.append(self.fixed - before)
+
+                if self.fixed == before:
+                    break
+
+                cells = {k for e in self.changed for k in self.sides[e]}
+                nodes = {k for e in self.changed for k in self.ends[e]}
+                small = {k for e in self.changed for k in self.small_sides[e]}
+        except Contradiction:
+            self.contradiction = True
+
+        return self.literals()
+
+    def _set(self, edge: int, value: int):
+        if self.state[edge] == value:
+            return
+        if self.state[edge] != UNKNOWN:
+            raise Contradiction()
+
+        self.state[edge] = value
+        self.fixed += 1
+        self.changed.append(edge)
+
+    def _patterns(self):
+        """Corners and 3-3 neighbours, they only depend on the clues."""
+        m = self.board.rows
+        n = self.board.columns
+        cells = self.board.cells
+
+        corners = [
+            (cells[0][0], [cells[0][0].top, cells[0][0].left]),
+            (cells[0][n - 1], [cells[0][n - 1].top, cells[0][n - 1].right]),
+            (cells[m - 1][0], [cells[m - 1][0].bottom, cells[m - 1][0].left]),
+            (
+                cells[m - 1][n - 1],
+                [cells[m - 1][n - 1].bottom, cells[m - 1][n - 1].right],
+            ),
+        ]
+        awaylines = [
+            [cells[0][1].top, cells[1][0].left],
+            [cells[0][n - 2].top, cells[1][n - 1].right],
+            [cells[m - 1][1].bottom, cells[m - 2][0].left],
+            [cells[m - 1][n - 2].bottom, cells[m - 2][n - 1].right],
+        ]
+        for (corner, lines), away in zip(corners, awaylines):
+            if corner.value == 1:
+                for e in lines:
+                    self._set(e, OFF)
+            elif corner.value == 3:
+                for e in lines:
+                    self._set(e, ON)
+            elif corner.value == 2:
+                for e in away:
+                    self._set(e, ON)
+
+        for i in range(m):
+            for j in range(n):
+                cell = cells[i][j]
+                if cell.value != 3:
+                    continue
+
+                if j + 1 < n and cells[i][j + 1].value == 3:
+                    for e in [cell.left, cell.right, cells[i][j + 1].right]:
+                        self._set(e, ON)
+                if i + 1 < m and cells[i + 1][j].value == 3:
+                    for e in [cell.top, cell.bottom, cells[i + 1][j].bottom]:
+                        self._set(e, ON)
+                if i + 1 < m and j + 1 < n and cells[i + 1][j + 1].value == 3:
+                    other = cells[i + 1][j + 1]
+                    for e in [cell.top, cell.left, other.bottom, other.right]:
+                        self._set(e, ON)
+                if i + 1 < m and j > 0 and cells[i + 1][j - 1].value == 3:
+                    other = cells[i + 1][j - 1]
+                    for e in [cell.top, cell.right, other.bottom, other.left]:
+                        self._set(e, ON)
+
+    def _cell_rules(self, cells):
+        state = self.state
+        for k in cells:
+            value, edges = self.cells[k]
+            on = sum(1 for e in edges if state[e] == ON)
+            unknown = [e for e in edges if state[e] == UNKNOWN]
+
+            if on > value or on + len(unknown) < value:
+                raise Contradiction()
+            if not unknown:
+                continue
+
+            if on == value:
+                for e in unknown:
+                    self._set(e, OFF)
+            elif on + len(unknown) == value:
+                for e in unknown:
+                    self._set(e, ON)
+
+    def _node_rules(self, nodes):
+        """A node has either zero or two edges."""
+        state = self.state
+        for k in nodes:
+            edges = self.nodes[k]
+            on = sum(1 for e in edges if state[e] == ON)
+            unknown = [e for e in edges if state[e] == UNKNOWN]
+
+            if on > 2 or (on == 1 and not unknown):
+                raise Contradiction()
+
+            if on == 2:
+                for e in unknown:
+                    self._set(e, OFF)
+            elif on == 1 and len(unknown) == 1:
+                self._set(unknown[0], ON)
+            elif on == 0 and len(unknown) == 1:
+                self._set(unknown[0], OFF)
+
+    def _small_loop_rules(self, loops):
+        """The last edge of a forbidden small loop is off."""
+        state = self.state
+        for k in loops:
+            edges = self.small[k]
+            rest = [e for e in edges if state[e] != ON]
+            if not rest:
+                raise Contradiction()
+            if len(rest) == 1 and state[rest[0]] == UNKNOWN:
+                self._set(rest[0], OFF)
+
+    def _loop_rules(self):
+        """An edge joining both ends of a path closes a loop, which is only allowed
+        when that loop is the whole answer."""
+        state = self.state
+        parent = list(range(len(self.nodes)))
+        lengths = [0] * len(self.nodes)
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        total = 0
+        closed = []
+        for e, s in enumerate(state):
+            if s != ON:
+                continue
+
+            a, b = self.ends[e]
+            ra, rb = find(a), find(b)
+            if ra == rb:
+                lengths[ra] += 1
+                closed.append(ra)
+            else:
+                parent[rb] = ra
+                lengths[ra] += lengths[rb] + 1
+            total += 1
+
+        if closed:
+            # a finished loop must be the only one, every other edge is off
+            if len(closed) > 1 or lengths[find(closed[0])] != total:
+                raise Contradiction()
+            for e, s in enumerate(state):
+                if e and s == UNKNOWN:
+                    self._set(e, OFF)
+            return
+
+        for e, s in enumerate(state):
+            if e == 0 or s != UNKNOWN:
+                continue
+
+            a, b = self.ends[e]
+            root = find(a)
+            if root != find(b):
+                continue
+
+            if lengths[root] != total or not self._closes(e):
+                self._set(e, OFF)
+
+    def _closes(self, edge: int) -> bool:
+        """Whether the ON edges plus `edge` satisfy every clue."""
+        state = self.state
+        return all(
+            sum(1 for e in edges if state[e] == ON or e == edge) == value
+            for value, edges in self.cells
+        )
+
+
+def simplify(clauses: List[List[int]], literals: List[int]) -> List[List[int]]:
+    """Drops the clauses satisfied by `literals` and their false literals."""
+    fixed = frozenset(literals)
+
+    return [
+        [x for x in clause if -x not in fixed]
+        for clause in clauses
+        if fixed.isdisjoint(clause)
+    ]
@@ -1,40 +1,113 @@
-from models import Board, Cell
+from models import Board, PuzzleSpec
 from pathlib import Path
-from typing import List
-from functools import cache
+from typing import Dict, Iterator, Tuple
+import os
+
+from store import PuzzleStore, store_path
 
 DB_DIR = "data"
 
 
 class BoardRepository:
+    """Hands out PuzzleSpec, immutable, so callers share them without copying.
+
+    Make a Board of your own with PuzzleSpec.to_board to solve or show one.
+    """
+
     def __init__(self):
         self.database_path = "puzzles.txt"
 
-    def find_all(self, size, diff):
+    def find_all(self, size, diff) -> Tuple[PuzzleSpec, ...]:
         return load_puzzles(f"{DB_DIR}/puzzle_{size} {diff}.txt")
 
+    def iter_all(self, size, diff) -> Iterator[PuzzleSpec]:
+        """Like find_all, but reads the puzzles one at a time."""
+        return iter_puzzles(f"{DB_DIR}/puzzle_{size} {diff}.txt")
+
+    def find_one(self, size, diff, index: int) -> PuzzleSpec:
+        """Only decodes that puzzle when the file was converted, see store.py."""
+        path = f"{DB_DIR}/puzzle_{size} {diff}.txt"
+        store = open_store(path)
+        if store is None:
+            return load_puzzles(path)[index]
+
+        return store[index]
+
+    def count(self, size, diff) -> int:
+        path = f"{DB_DIR}/puzzle_{size} {diff}.txt"
+        store = open_store(path)
+        if store is None:
+            return len(load_puzzles(path))
+
+        return len(store)
+
+
+# file -> (stamp of the files, what was read from them)
+_stores: Dict[str, Tuple[tuple, PuzzleStore | None]] = {}
+_puzzles: Dict[str, Tuple[tuple, Tuple[PuzzleSpec, ...]]] = {}
+
+
+def _stamp(*paths: Path | str) -> tuple:
+    """Changes when one of the files is written or replaced."""
+    stamp = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            stamp.append((st.st_ino, st.st_size, st.st_mtime_ns))
+        except FileNotFoundError:
+            stamp.append(None)
 
-@cache
-def load_puzzles(filepath: Path | str) -> List[Board]:
-    boards = []
+    return tuple(stamp)
+
+
+def open_store(filepath: Path | str) -> PuzzleStore | None:
+    """The packed file of a text puzzle file, None when it is missing or was made
+    from another text (see PuzzleStore.made_from). Checked again when either file
+    changes, the store handed out before is closed then."""
+    path = store_path(filepath)
+    stamp = _stamp(filepath, path)
+    known = _stores.get(str(filepath))
+    if known is not None and known[0] == stamp:
+        return known[1]
+    if known is not None and known[1] is not None:
+        known[1].close()
+
+    store = None
+    if stamp[1] is not None:
+        try:
+            store = PuzzleStore(path)
+        except ValueError:
+            # an older format, the text file is used until it is converted again
+            pass
+    if store is not None and (stamp[0] is None or not store.made_from(filepath)):
+        store.close()
+        store = None
+    _stores[str(filepath)] = (stamp, store)
+
+    return store
+
+
+def load_puzzles(filepath: Path | str) -> Tuple[PuzzleSpec, ...]:
+    stamp = _stamp(filepath, store_path(filepath))
+    known = _puzzles.get(str(filepath))
+    if known is None or known[0] != stamp:
+        known = _puzzles[str(filepath)] = (stamp, tuple(iter_puzzles(filepath)))
+
+    return known[1]
+
+
+def iter_puzzles(filepath: Path | str) -> Iterator[PuzzleSpec]:
+    store = open_store(filepath)
+    if store is not None:
+        yield from store
+        return
 
     with open(filepath, "r") as f:
-        lines = f.readlines()
-
-        for line in lines:
-            rows, columns, *cells_flat = [int(x) for x in line.split(" ")]
-            cell_vals = [
-                cells_flat[slice(columns * i, columns * i + columns)]
-                for i in range(rows)
-            ]
-
-            cells = []
-            for i, row in enumerate(cell_vals):
-                rows_cell = []
-                for j, item in enumerate(row):
-                    rows_cell.append(Cell(value=item, row=i, column=j))
-                cells.append(rows_cell)
-            board = Board(rows, columns, cells)
-            boards.append(board)
-
-    return boards
+        for line in f:
+            if line.strip():
+                yield PuzzleSpec.parse(line)
+
+
+def parse_puzzle(line: str) -> Board:
+    """One puzzle per line: rows, columns, then the cells row by row."""
+    return PuzzleSpec.parse(line).to_board()
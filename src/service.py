@@ -0,0 +1,457 @@
+"""Local solve service.
+
+An HTTP/1.1 server on a TCP port or a Unix socket, with no dependency outside the
+standard library:
+
+    python src/service.py --port 8765 --jobs 4
+    python src/service.py --unix /tmp/slitherlink.sock
+
+    POST   /jobs              {"puzzle": "5 5 ..."} or {"rows", "columns",
+                              "clues"}, optional "mode" and "timeout"
+                              -> 202 {"id", "status"}, 429 when the queue is full
+    GET    /jobs/<id>         -> {"id", "status", "edges", "stats"}
+    GET    /jobs/<id>/events  -> one JSON line per solver event until it is done
+    DELETE /jobs/<id>         -> detaches one of its clients
+
+Jobs are solved on a process pool. A job submitted while the same puzzle (with
+the same mode and timeout) is queued or running gets the id of that job instead
+of a new one, and one more client. The job is cancelled once every client that
+submitted it detached. Status is one of solver.Status, or "queued" and "running"
+before that.
+
+SolveClient talks to it from asyncio code.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import AsyncIterator, Dict, List, Set, Tuple
+
+from models import PuzzleSpec
+from solver import MySolver, SolveEvent, Status
+from worker import parse_line
+
+QUEUED = "queued"
+RUNNING = "running"
+# jobs queued or running at once, per worker process
+QUEUE_PER_JOB = 4
+# finished jobs kept for GET, the oldest are dropped first
+KEEP_DONE = 1000
+# bytes of a request body
+MAX_BODY = 2**20
+
+REASONS = {
+    200: "OK",
+    202: "Accepted",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+}
+
+
+def _solve(job_id: int, spec: PuzzleSpec, mode: str, timeout, cancel, progress):
+    """Runs in a pool process, events go back through the `progress` queue."""
+
+    def send(event: SolveEvent):
+        progress.put(
+            (
+                job_id,
+                {
+                    "kind": event.kind,
+                    "iteration": event.iteration,
+                    "elapsed": event.elapsed,
+                    "loops": event.loops,
+                    "cuts": event.cuts,
+                },
+            )
+        )
+
+    progress.put((job_id, {"kind": RUNNING}))
+    solver = MySolver(spec, cancel_event=cancel, mode=mode, timeout=timeout)
+    solver.add_event_callback(send)
+    solver.solve()
+    result = solver.result()
+
+    return {
+        "status": result.status,
+        "edges": sorted(result.edges),
+        "stats": asdict(result.stats),
+    }
+
+
+@dataclass
+class Job:
+    id: int
+    key: Tuple[PuzzleSpec, str, float]
+    # set in the pool process by the last client to detach, see SolveService.cancel
+    cancel: object = None
+    # submits of it not yet detached
+    clients: int = 1
+    status: str = QUEUED
+    edges: List[int] = field(default_factory=list)
+    stats: Dict = field(default_factory=dict)
+    events: List[Dict] = field(default_factory=list)
+    # queues of the clients streaming the events
+    listeners: Set[asyncio.Queue] = field(default_factory=set)
+    future: object = None
+
+    @property
+    def done(self) -> bool:
+        return self.status not in (QUEUED, RUNNING)
+
+    def view(self) -> Dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "edges": self.edges,
+            "stats": self.stats,
+        }
+
+
+class SolveService:
+    def __init__(self, jobs: int = None, max_queue: int = None):
+        self.jobs = jobs or os.cpu_count()
+        self.max_queue = max_queue or self.jobs * QUEUE_PER_JOB
+        self.ids = itertools.count(1)
+        self.table: OrderedDict[int, Job] = OrderedDict()
+        self.active: Dict[Tuple[PuzzleSpec, str, float], Job] = {}
+        self.server = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0, path: str = None):
+        """Listens on `path` (a Unix socket) or else on host:port, 0 picks a port."""
+        self.loop = asyncio.get_running_loop()
+        # a forked process would keep the sockets of the server open
+        context = multiprocessing.get_context("forkserver")
+        # pool processes see the cancel events and the progress queue through it
+        self.manager = await asyncio.to_thread(context.Manager)
+        self.progress = self.manager.Queue()
+        self.pool = ProcessPoolExecutor(self.jobs, mp_context=context)
+        self.pump = threading.Thread(target=self._pump, daemon=True)
+        self.pump.start()
+
+        if path:
+            self.server = await asyncio.start_unix_server(self._handle, path=path)
+        else:
+            self.server = await asyncio.start_server(self._handle, host, port)
+
+        return self.server.sockets[0].getsockname()
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        # stops the running jobs and waits for them, off the event loop
+        await asyncio.to_thread(self._shutdown, list(self.active.values()))
+
+    def _shutdown(self, jobs: List[Job]):
+        for job in jobs:
+            if job.cancel is not None:
+                job.cancel.set()
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        self.progress.put(None)
+        self.pump.join()
+        self.manager.shutdown()
+
+    async def submit(self, spec: PuzzleSpec, mode: str, timeout: float) -> Job | None:
+        """The job of the puzzle, None when the queue is full."""
+        key = (spec, mode, timeout)
+        job = self.active.get(key)
+        if job is not None:
+            job.clients += 1
+            return job
+        if len(self.active) >= self.max_queue:
+            return None
+
+        job = Job(id=next(self.ids), key=key)
+        self.table[job.id] = job
+        self.active[key] = job
+        # a round trip to the manager process, the job is already listed so
+        # the same puzzle submitted meanwhile shares it
+        job.cancel = await asyncio.to_thread(self.manager.Event)
+        if job.done:
+            # every client detached meanwhile
+            return job
+
+        job.future = self.pool.submit(
+            _solve, job.id, spec, mode, timeout, job.cancel, self.progress
+        )
+        job.future.add_done_callback(
+            lambda future: self.loop.call_soon_threadsafe(self._finish, job, future)
+        )
+
+        return job
+
+    async def cancel(self, job: Job):
+        """Detaches one client, the last one cancels the job."""
+        if job.done:
+            return
+        job.clients -= 1
+        if job.clients > 0:
+            return
+
+        if job.future is None:
+            # still waiting for its cancel event in submit
+            job.status = Status.CANCELLED
+            self._close(job)
+        elif not job.future.cancel():
+            # a queued job never starts, a running one stops at its next check
+            await asyncio.to_thread(job.cancel.set)
+
+    def _pump(self):
+        """Moves the events of the pool processes to the event loop."""
+        while True:
+            item = self.progress.get()
+            if item is None:
+                return
+            self.loop.call_soon_threadsafe(self._event, *item)
+
+    def _event(self, job_id: int, event: Dict):
+        job = self.table.get(job_id)
+        if job is None or job.done:
+            return
+
+        if event["kind"] == RUNNING:
+            job.status = RUNNING
+        job.events.append(event)
+        for listener in job.listeners:
+            listener.put_nowait(event)
+
+    def _finish(self, job: Job, future):
+        try:
+            answer = future.result()
+            job.status = answer["status"]
+            job.edges = answer["edges"]
+            job.stats = answer["stats"]
+        except CancelledError:
+            job.status = Status.CANCELLED
+        except Exception as error:
+            job.status = "error"
+            job.stats = {"error": repr(error)}
+
+        self._close(job)
+
+    def _close(self, job: Job):
+        """Frees its place in the queue and tells the listeners that it is done."""
+        self.active.pop(job.key, None)
+        for listener in job.listeners:
+            listener.put_nowait(None)
+
+        done = [k for k, other in self.table.items() if other.done]
+        for k in done[: max(0, len(done) - KEEP_DONE)]:
+            del self.table[k]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            method, path, body = await _read_request(reader)
+            await self._route(method, path, body, writer)
+        except (ValueError, KeyError, TypeError) as error:
+            _respond(writer, 400, {"error": str(error)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            with contextlib.suppress(ConnectionError):
+                await writer.drain()
+            writer.close()
+
+    async def _route(self, method: str, path: str, body: bytes, writer):
+        parts = path.strip("/").split("/")
+        if parts == ["jobs"]:
+            if method != "POST":
+                return _respond(writer, 405, {"error": method})
+
+            item = json.loads(body or b"{}")
+            if not isinstance(item, dict):
+                raise ValueError("the body is not a JSON object")
+            if "puzzle" in item or "clues" in item:
+                _, spec = parse_line(json.dumps(item), 0)
+            else:
+                raise ValueError("no puzzle")
+            mode = item.get("mode", "lazy")
+            if mode not in MySolver.MODES:
+                raise ValueError(f"mode {mode}")
+
+            job = await self.submit(spec, mode, item.get("timeout"))
+            if job is None:
+                return _respond(writer, 429, {"error": "queue full"})
+            return _respond(writer, 202, {"id": job.id, "status": job.status})
+
+        if len(parts) < 2 or parts[0] != "jobs" or not parts[1].isdigit():
+            return _respond(writer, 404, {"error": path})
+        job = self.table.get(int(parts[1]))
+        if job is None:
+            return _respond(writer, 404, {"error": path})
+
+        if parts[2:] == ["events"] and method == "GET":
+            return await self._stream(job, writer)
+        if parts[2:]:
+            return _respond(writer, 404, {"error": path})
+        if method == "GET":
+            return _respond(writer, 200, job.view())
+        if method == "DELETE":
+            await self.cancel(job)
+            return _respond(writer, 202, {"id": job.id, "status": job.status})
+
+        return _respond(writer, 405, {"error": method})
+
+    async def _stream(self, job: Job, writer: asyncio.StreamWriter):
+        """The events so far, then each new one, then the job itself."""
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        queue = asyncio.Queue()
+        for event in job.events:
+            queue.put_nowait(event)
+        if job.done:
+            queue.put_nowait(None)
+        else:
+            job.listeners.add(queue)
+
+        try:
+            while (event := await queue.get()) is not None:
+                writer.write(json.dumps(event).encode() + b"\n")
+                await writer.drain()
+            writer.write(json.dumps(job.view()).encode() + b"\n")
+        finally:
+            job.listeners.discard(queue)
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Tuple[str, str, bytes]:
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError()
+    method, path, _ = line.decode("latin-1").split(" ", 2)
+
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY:
+        raise ValueError("body too large")
+    body = await reader.readexactly(length) if length else b""
+
+    return method.upper(), path, body
+
+
+def _respond(writer: asyncio.StreamWriter, code: int, payload: Dict):
+    body = json.dumps(payload).encode()
+    writer.write(
+        f"HTTP/1.1 {code} {REASONS[code]}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+    )
+
+
+class SolveClient:
+    """Calls a SolveService, one connection per request."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = None, path: str = None):
+        self.host = host
+        self.port = port
+        self.path = path
+
+    async def _open(self):
+        if self.path:
+            return await asyncio.open_unix_connection(self.path)
+        return await asyncio.open_connection(self.host, self.port)
+
+    async def _send(self, method: str, url: str, payload: Dict = None):
+        reader, writer = await self._open()
+        body = json.dumps(payload).encode() if payload is not None else b""
+        writer.write(
+            f"{method} {url} HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+        status = int((await reader.readline()).split()[1])
+        while (await reader.readline()) not in (b"\r\n", b""):
+            pass
+
+        return status, reader, writer
+
+    async def request(self, method: str, url: str, payload: Dict = None):
+        """(HTTP status, JSON body)."""
+        status, reader, writer = await self._send(method, url, payload)
+        body = await reader.read()
+        writer.close()
+
+        return status, json.loads(body)
+
+    async def submit(self, puzzle: str, mode: str = "lazy", timeout: float = None):
+        """The job id, None when the queue is full."""
+        payload = {"puzzle": puzzle, "mode": mode, "timeout": timeout}
+        status, body = await self.request("POST", "/jobs", payload)
+
+        return body["id"] if status == 202 else None
+
+    async def job(self, job_id: int) -> Dict:
+        return (await self.request("GET", f"/jobs/{job_id}"))[1]
+
+    async def cancel(self, job_id: int) -> Dict:
+        return (await self.request("DELETE", f"/jobs/{job_id}"))[1]
+
+    async def events(self, job_id: int) -> AsyncIterator[Dict]:
+        """The events of the job, the last one is the finished job."""
+        _, reader, writer = await self._send("GET", f"/jobs/{job_id}/events")
+        try:
+            while line := await reader.readline():
+                yield json.loads(line)
+        finally:
+            writer.close()
+
+    async def solve(self, puzzle: str, mode: str = "lazy", timeout: float = None):
+        """Submits the puzzle and waits for the finished job."""
+        job_id = await self.submit(puzzle, mode, timeout)
+        if job_id is None:
+            return None
+
+        last = None
+        async for last in self.events(job_id):
+            pass
+
+        return last
+
+
+async def serve(host: str, port: int, path: str, jobs: int, max_queue: int):
+    service = SolveService(jobs, max_queue)
+    address = await service.start(host, port, path)
+    print(f"listening on {address}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await service.close()
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("-p", "--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket instead")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=os.cpu_count(), help="worker processes"
+    )
+    parser.add_argument(
+        "-q",
+        "--queue",
+        type=int,
+        help=f"jobs queued or running before 429 (default: {QUEUE_PER_JOB} per job)",
+    )
+    args = parser.parse_args(argv)
+
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(serve(args.host, args.port, args.unix, args.jobs, args.queue))
+
+
+if __name__ == "__main__":
+    main()
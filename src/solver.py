@@ -1,14 +1,51 @@
-from typing import List, MutableSet, Callable, FrozenSet
-from collections import defaultdict
-import sys
-from dataclasses import dataclass
-from models import Board, Node
-from functools import cache
+from __future__ import annotations
+
+from typing import AbstractSet, Dict, List, MutableSet, Callable, FrozenSet
+from typing import TYPE_CHECKING
+from contextlib import contextmanager
+from copy import deepcopy
+from dataclasses import dataclass, field, replace
+from models import Board, PuzzleSpec
+from presolve import Presolver, simplify
+from encoding import cell_clauses, shape_clauses
 import threading
-from utils import measure_time
-from pysat.solvers import Solver
 import time
 
+if TYPE_CHECKING:
+    # pysat is loaded by the first solve, sqlite3 with the first SolutionCache
+    from cache import SolutionCache
+    from pysat.solvers import Solver
+
+# seconds between two checks of the watchdog, a cancel is seen at once
+WATCHDOG_INTERVAL = 0.05
+# pysat names of the backends with fewer controls than the minisat family
+LINGELING = ["lgl", "lingeling"]
+CADICAL = [
+    *["cd", "cd103", "cdl", "cdl103", "cadical103"],
+    *["cd15", "cd153", "cdl15", "cdl153", "cadical153"],
+    *["cd19", "cd195", "cdl19", "cdl195", "cadical195"],
+    *["cd30", "cd300", "cdl30", "cdl300", "cadical300"],
+]
+# backends that can not interrupt a running SAT call, those with a conflict budget
+# run it in slices instead and check for a cancel or timeout between two
+NO_INTERRUPT = LINGELING + CADICAL
+NO_PROP_BUDGET = LINGELING + CADICAL
+# without solve_limited either, a running SAT call can not be stopped at all
+NO_CONF_BUDGET = LINGELING
+# conflicts of the first slice, it adapts so a slice takes about WATCHDOG_INTERVAL
+POLL_CONFLICTS = 10
+# the only pysat backends with the incremental mode
+INCREMENTAL = ["g3", "g30", "glucose3", "g4", "g41", "glucose4", "glucose41"]
+
+
+class Status:
+    SOLVED = "solved"
+    UNSOLVABLE = "unsolvable"
+    CANCELLED = "cancelled"
+    TIMEOUT = "timeout"
+    # the conflict or propagation budget ran out
+    BUDGET = "budget"
+
 
 @dataclass
 class Statistics:
@@ -16,6 +53,49 @@ class Statistics:
     clauses: int = 0
     variables: int = 0
     retried: int = 0
+    cuts: int = 0
+    cut_literals: int = 0
+    presolved: int = 0
+    presolve_passes: List[int] = field(default_factory=list)
+    status: str = ""
+    backend: str = ""
+    # seconds spent in each phase of the solve, see MySolver.PHASES
+    phases: Dict[str, float] = field(default_factory=dict)
+    # number of loops in each model of the SAT solver
+    loops: List[int] = field(default_factory=list)
+    peak_clauses: int = 0
+    assumptions: int = 0
+    # answers found, see MySolver.count_solutions
+    solutions: int = 0
+    # counters of the SAT backend, over all its calls
+    conflicts: int = 0
+    decisions: int = 0
+    propagations: int = 0
+    # lookups in the solution cache, see MySolver(cache=...)
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+    @property
+    def encode_time(self) -> float:
+        return self.phases.get("encode", 0)
+
+    @property
+    def sat_time(self) -> float:
+        return self.phases.get("sat", 0)
+
+    @property
+    def validate_time(self) -> float:
+        return self.phases.get("validate", 0)
+
+    def snapshot(self) -> Statistics:
+        """A copy without the per-model `loops` history, the one list that grows
+        with the solve, so taking one per model stays cheap."""
+        return replace(
+            self,
+            presolve_passes=list(self.presolve_passes),
+            phases=dict(self.phases),
+            loops=[],
+        )
 
     # def __init__(self):
     #     self.acum_time = 0
@@ -28,21 +108,142 @@ class Statistics:
         self.clauses = 0
         self.variables = 0
         self.retried = 0
+        self.cuts = 0
+        self.cut_literals = 0
+        self.presolved = 0
+        self.presolve_passes = []
+        self.status = ""
+        self.backend = ""
+        self.phases = {}
+        self.loops = []
+        self.peak_clauses = 0
+        self.assumptions = 0
+        self.solutions = 0
+        self.conflicts = 0
+        self.decisions = 0
+        self.propagations = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+@dataclass
+class SolveEvent:
+    """One step of a solve, sent to the callbacks of add_event_callback."""
+
+    # "presolve", "model" for every answer of the SAT solver, or "finish"
+    kind: str
+    # models found so far
+    iteration: int
+    # seconds since solve() started
+    elapsed: float
+    # a snapshot, the solver keeps updating its own, see Statistics.snapshot
+    stats: Statistics
+    # loops in this model and cuts added against them
+    loops: int = 0
+    cuts: int = 0
+
+
+@dataclass(frozen=True)
+class SolveResult:
+    """The outcome of a solve, without the solver and its board."""
+
+    spec: PuzzleSpec
+    status: str
+    # edge ids of the answer, empty unless solved
+    edges: FrozenSet[int]
+    stats: Statistics
+
+    @property
+    def solved(self) -> bool:
+        return self.status == Status.SOLVED
+
+    def to_board(self) -> Board:
+        board = self.spec.to_board()
+        board.set_solution(self.edges)
+        board.solved = self.solved
+
+        return board
+
+
+class CutManager:
+    """Adds loop cuts to a running solver, every loop is cut only once."""
+
+    def __init__(self, solver: Solver, stats: Statistics):
+        self.solver = solver
+        self.stats = stats
+        self.loops: MutableSet[FrozenSet[int]] = set()
+
+    def __contains__(self, loop: FrozenSet[int]) -> bool:
+        return loop in self.loops
+
+    def add(self, loop: FrozenSet[int], clauses: List[List[int]]) -> bool:
+        if loop in self.loops:
+            return False
+
+        self.loops.add(loop)
+        self.solver.append_formula(clauses)
+        self.stats.cuts += 1
+        self.stats.cut_literals += sum(len(clause) for clause in clauses)
+
+        return True
 
 
 class MySolver:
+    # "lazy" only encodes local rules and cuts extra loops after each model,
+    # "connectivity" also encodes the single loop rule so one SAT call is enough.
+    MODES = ["lazy", "connectivity"]
+    # timed parts of solve(), each one without the phases nested in it
+    PHASES = ["index", "presolve", "encode", "sat", "validate", "extract"]
+
     def __init__(
         self,
-        board: Board,
+        board: Board | PuzzleSpec,
         cancel_event: threading.Event = None,
+        mode: str = "lazy",
+        presolve: bool = True,
+        timeout: float = None,
+        conflicts: int = None,
+        propagations: int = None,
+        backend: str = "g4",
+        phase: bool = None,
+        cache: SolutionCache = None,
     ):
+        assert mode in MySolver.MODES
+        if conflicts and backend in NO_CONF_BUDGET:
+            raise ValueError(f"{backend} has no conflict budget")
+        if propagations and backend in NO_PROP_BUDGET:
+            raise ValueError(f"{backend} has no propagation budget")
+        if timeout and backend in NO_CONF_BUDGET:
+            raise ValueError(f"{backend} can not stop a running SAT call on timeout")
+
+        # the solver writes the answer on its board, a spec gets a board of its own
+        if isinstance(board, PuzzleSpec):
+            board = board.to_board()
         self.board = board
         self.cancel_event = cancel_event
+        self.mode = mode
+        self.presolve = presolve
+        self.timeout = timeout
+        self.conflicts = conflicts
+        self.propagations = propagations
+        self.deadline = None
+        # any pysat solver name, phase is the preferred value of the edges
+        self.backend = backend
+        self.phase = phase
+        # answers of earlier solves, solve() looks there first
+        self.cache = cache
+        self.interruptible = backend not in NO_INTERRUPT
+        self.polling = not self.interruptible and backend not in NO_CONF_BUDGET
         self.stats = Statistics()
+        self.top_var = 0
+        self.edges_count = 0
+        self.solution: FrozenSet[int] = frozenset()
 
         self.assumpsions = []
-        self.hint_clauses = []
         self.subcribers = []
+        self.event_subcribers = []
+        self._nested = 0
+        self._started = 0
         pass
 
     def add_partial_solution_callback(
@@ -50,31 +251,152 @@ class MySolver:
     ):
         self.subcribers.append(callback)
 
-    @measure_time
+    def add_event_callback(self, callback: Callable[[SolveEvent], None]):
+        """Like add_partial_solution_callback, but called with a SolveEvent after
+        presolving, after every model and when the solve is over."""
+        self.event_subcribers.append(callback)
+
     def solve(self) -> Board:
+        if self.cache is None:
+            return self._solve(limit=1)
+
         start = time.perf_counter()
-        self.assign_edges_index()
+        spec = PuzzleSpec.of(self.board)
+        edges = self.cache.get(spec)
+        if edges is not None:
+            self.stats.cache_hits += 1
+            self.stats.solutions = 1
+            self.stats.acum_time = time.perf_counter() - start
+            return self.load_solution(list(edges))
+
+        self.stats.cache_misses += 1
+        board = self._solve(limit=1)
+        if board.solved:
+            self.cache.put(spec, self.solution)
+
+        return board
+
+    def count_solutions(self, limit: int = 2) -> int:
+        """Counts the answers of the board, up to `limit`.
+
+        Every answer is blocked on the same SAT solver once found, keeping the
+        loop cuts learned so far, and the search goes on. Fewer than `limit`
+        answers is the exact count when stats.status is solved (or unsolvable,
+        for 0), and the board keeps the first answer. After a cancel or timeout
+        the count is only a lower bound and the board is cleared, as after any
+        unfinished solve, even when an answer was found.
+        """
+        self._solve(limit)
+
+        return self.stats.solutions
+
+    def is_unique(self) -> bool:
+        return self.count_solutions(2) == 1 and self.stats.status == Status.SOLVED
+
+    def result(self) -> SolveResult:
+        """The outcome of the last solve, it shares nothing with this solver."""
+        return SolveResult(
+            spec=PuzzleSpec.of(self.board),
+            status=self.stats.status,
+            edges=self.solution if self.board.solved else frozenset(),
+            stats=deepcopy(self.stats),
+        )
+
+    def _solve(self, limit: int) -> Board:
+        start = time.perf_counter()
+        self._started = start
+        self.deadline = start + self.timeout if self.timeout else None
+        self.stats.backend = self.backend
+        if self.phase is not None:
+            self.stats.backend += ":on" if self.phase else ":off"
+        with self._phase("index"):
+            self.assign_edges_index()
+
+        fixed = []
+        if self.presolve:
+            with self._phase("presolve"):
+                presolver = Presolver(self.board)
+                fixed = presolver.run()
+            self.stats.presolved = presolver.fixed
+            self.stats.presolve_passes = presolver.passes
+            self._emit("presolve")
+
+            # nothing left for the SAT solver
+            if presolver.contradiction or presolver.solved:
+                status = Status.UNSOLVABLE
+                if presolver.solved:
+                    loop = frozenset(x for x in fixed if x > 0)
+                    self._extract_solution(list(loop))
+                    if len(self.extract_loops(loop)) == 1:
+                        # the deductions hold for every answer, so it is the only one
+                        status = Status.SOLVED
+                        self.stats.solutions = 1
+                self.stats.acum_time += time.perf_counter() - start
+
+                return self._finish(status)
+
+        if self._stopped():
+            return self._finish(self._stop_reason())
+
+        from pysat.solvers import Solver
+
+        options = {}
+        if self.backend in INCREMENTAL:
+            options = {"warm_start": True, "incr": True}
+        with self._phase("encode"):
+            contraints = self.encode_rules(fixed)
+            solver = Solver(
+                self.backend, bootstrap_with=contraints, use_timer=True, **options
+            )
+        with solver, self._watchdog(solver):
+            if self.conflicts and not self.polling:
+                solver.conf_budget(self.conflicts)
+            if self.propagations:
+                solver.prop_budget(self.propagations)
+            if self.phase is not None:
+                sign = 1 if self.phase else -1
+                solver.set_phases([sign * e for e in range(1, self.edges_count + 1)])
+
+            cuts = CutManager(solver, self.stats)
+            self.stats.assumptions = len(self.assumpsions)
+            retried = 0
+            status = Status.UNSOLVABLE
+            first = None
+            while True:
+                with self._phase("sat"):
+                    if self.interruptible:
+                        found = solver.solve_limited(
+                            assumptions=self.assumpsions, expect_interrupt=True
+                        )
+                    elif self.polling:
+                        found = self._solve_in_slices(solver)
+                    else:
+                        found = solver.solve(assumptions=self.assumpsions)
+                self._count_search(solver)
+                if found is None:
+                    self.stats.acum_time += time.perf_counter() - start
+                    status = self._stop_reason()
+                    break
+                if not found:
+                    if first:
+                        status = Status.SOLVED
+                    break
+
+                test_solution = solver.get_model()
+                retried += 1
 
-        contraints = self.encode_rules()
-        with Solver(
-            "g4",
-            bootstrap_with=contraints,
-            use_timer=True,
-            warm_start=True,
-            incr=True,
-        ) as solver:
-            for retried, test_solution in enumerate(
-                solver.enum_models(assumptions=self.assumpsions),
-                start=1,
-            ):
                 # Update stats
                 self.stats.clauses = solver.nof_clauses()
+                self.stats.peak_clauses = max(
+                    self.stats.peak_clauses, self.stats.clauses
+                )
                 self.stats.variables = solver.nof_vars()
                 self.stats.acum_time += solver.time() + time.perf_counter() - start
                 self.stats.retried = retried
 
                 # Check for cancellation
-                if self.cancel_event and self.cancel_event.is_set():
+                if self._stopped():
+                    status = self._stop_reason()
                     break
 
                 if self.subcribers:
@@ -84,100 +406,300 @@ class MySolver:
 
                 start = time.perf_counter()
 
-                for hints in self.hint_clauses:
-                    solver.add_clause(hints)
-                if self._validate(test_solution):
-                    self._extract_solution(test_solution)
-                    self.board.solved = True
+                before = self.stats.cuts
+                with self._phase("validate"):
+                    valid = self._validate(test_solution, cuts)
+                self._emit(
+                    "model", loops=self.stats.loops[-1], cuts=self.stats.cuts - before
+                )
+                if not valid:
+                    continue
+
+                self.stats.solutions += 1
+                first = first or self.solution
+                if self.stats.solutions >= limit:
+                    status = Status.SOLVED
                     break
 
+                # look for another answer, the cuts stay valid
+                solver.add_clause([-e for e in sorted(self.solution)])
+
+        if first and first != self.solution:
+            self._extract_solution(list(first))
+
+        return self._finish(status)
+
+    def _finish(self, status: str) -> Board:
+        self.stats.status = status
+        self.board.solved = status == Status.SOLVED
+        if not self.board.solved:
+            # do not leave the last rejected model on the board
+            self.board.set_solution(())
+            self.solution = frozenset()
+        self._emit("finish")
+
         return self.board
 
-    def _dfs(self, node: Node, visited: MutableSet[Node]):
-        visited.add(node)
-        for neighbor in self.board.graph[node]:
-            if neighbor not in visited:
-                self._dfs(neighbor, visited)
+    def _emit(self, kind: str, **kwargs):
+        if not self.event_subcribers:
+            return
 
-    def _validate(self, ans):
-        models = frozenset(x for x in ans if x > 0)
-        for row in self.board.cells:
-            for cell in row:
-                if cell.edges().issubset(models):
-                    return False
+        event = SolveEvent(
+            kind=kind,
+            iteration=self.stats.retried,
+            elapsed=time.perf_counter() - self._started,
+            stats=self.stats.snapshot(),
+            **kwargs,
+        )
+        for callback in self.event_subcribers:
+            callback(event)
+
+    def _solve_in_slices(self, solver: Solver) -> bool | None:
+        """solve_limited of a backend without interrupt, in slices of conflicts
+        with a check for a cancel or timeout after each one. None when stopped or
+        out of conflict budget, like an interrupted call."""
+        if not self.cancel_event and not self.deadline and not self.conflicts:
+            return solver.solve(assumptions=self.assumpsions)
+
+        size = POLL_CONFLICTS
+        while True:
+            if self.conflicts:
+                # the budget of these backends only lasts for one call
+                left = self.conflicts - (solver.accum_stats() or {}).get("conflicts", 0)
+                if left <= 0:
+                    return None
+                size = min(size, left)
+
+            start = time.perf_counter()
+            solver.conf_budget(size)
+            found = solver.solve_limited(assumptions=self.assumpsions)
+            if found is not None or self._stopped():
+                return found
+            elapsed = time.perf_counter() - start
+            if elapsed < WATCHDOG_INTERVAL:
+                size *= 2
+            elif elapsed > 2 * WATCHDOG_INTERVAL:
+                size = max(1, size // 2)
+
+    def _count_search(self, solver: Solver):
+        counters = solver.accum_stats() or {}
+        self.stats.conflicts = counters.get("conflicts", 0)
+        self.stats.decisions = counters.get("decisions", 0)
+        self.stats.propagations = counters.get("propagations", 0)
+
+    def load_solution(self, edges: List[int]) -> Board:
+        """Puts a known answer, e.g. from another process, on the board."""
+        self.assign_edges_index()
+        self._extract_solution(edges)
+
+        return self._finish(Status.SOLVED)
 
+    @contextmanager
+    def _phase(self, name: str):
+        """Adds the time of the block to stats.phases[name], except the time of the
+        phases nested in it, which count for themselves."""
+        start = time.perf_counter()
+        outer = self._nested
+        self._nested = 0
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            phases = self.stats.phases
+            phases[name] = phases.get(name, 0) + elapsed - self._nested
+            self._nested = outer + elapsed
+
+    def _stopped(self, wait: float = 0) -> bool:
+        """Whether the solve is cancelled or out of time, waiting up to `wait`
+        seconds for that to happen."""
+        if self.deadline:
+            wait = min(wait, max(0, self.deadline - time.perf_counter()))
+        if self.cancel_event:
+            if self.cancel_event.wait(wait):
+                return True
+        elif wait:
+            time.sleep(wait)
+
+        return bool(self.deadline) and time.perf_counter() >= self.deadline
+
+    def _stop_reason(self) -> str:
+        if self.cancel_event and self.cancel_event.is_set():
+            return Status.CANCELLED
+        if self.deadline and time.perf_counter() >= self.deadline:
+            return Status.TIMEOUT
+
+        return Status.BUDGET
+
+    @contextmanager
+    def _watchdog(self, solver: Solver):
+        """Interrupts the running SAT call once the solve is cancelled or out of
+        time. It keeps interrupting until the solve loop notices, so an interrupt
+        that lands between two SAT calls is not lost."""
+        if not self.interruptible or (not self.cancel_event and not self.deadline):
+            yield
+            return
+
+        lock = threading.Lock()
+        done = False
+
+        def watch():
+            while True:
+                stopped = self._stopped(wait=WATCHDOG_INTERVAL)
+                with lock:
+                    if done:
+                        return
+                    if stopped:
+                        solver.interrupt()
+                if stopped:
+                    time.sleep(WATCHDOG_INTERVAL)
+
+        threading.Thread(target=watch, daemon=True).start()
+        try:
+            yield
+        finally:
+            with lock:
+                done = True
+
+    def _validate(self, ans, cuts: CutManager):
+        models = frozenset(x for x in ans if x > 0)
         self._extract_solution(ans)
 
         loops = self.extract_loops(models)
-
-        if len(loops) > 1:
-            # self.hint_clauses.append([-x for x in self.extract_loop_edge(visited)])
+        self.stats.loops.append(len(loops))
+        if len(loops) == 1:
+            return True
+        if not loops:
+            # only a board without positive clues allows no edges at all
+            cuts.add(frozenset(), [list(range(1, self.edges_count + 1))])
             return False
 
-        return True
+        loops = [set(loop) for loop in loops]
+        loops_inner = [self._inner_edges(loop) for loop in loops]
+        loops_edges = [inner & models for inner in loops_inner]
+        for edges in loops_edges:
+            # the other loops only pass by empty cells
+            if self._satisfies_clues(edges):
+                self._extract_solution(list(edges))
+                return True
 
-    def extract_loops(self, models):
-        loops = []
+        for loop, edges, inner in zip(loops, loops_edges, loops_inner):
+            if edges not in cuts:
+                cuts.add(edges, self._loop_cuts(loop, edges, inner))
 
-        def get_start():
-            return next(
-                (
-                    node
-                    for node, neighbors in self.board.graph.items()
-                    if neighbors and node not in all_visisted
-                ),
-                None,
-            )
+        return False
 
-        all_visisted = set()
-        start = get_start()
-
-        while start:
-            visited = set()
-            self._dfs(start, visited)
-            loops.append(visited)
-            hints = set()
-            for node in visited:
-                edges = [
-                    x
-                    for x in [node.top, node.bottom, node.left, node.right]
-                    if x in models
-                ]
-                hints.update(edges)
+    def _loop_cuts(
+        self, loop: AbstractSet[int], edges: FrozenSet[int], inner: FrozenSet[int]
+    ):
+        """Cuts against a loop that is not the answer.
+
+        When some clue has no edge between the loop's nodes, no answer lies only on
+        those nodes: using an edge between them means using an edge that leaves them.
+        `used` stands for "some edge between the nodes is used". Otherwise only this
+        exact loop is forbidden. `inner` are the edges between the loop's nodes.
+        """
+        if self._covers_clues(inner):
+            return [[-edge for edge in sorted(edges)]]
+
+        around = self.board.node_edges
+        ends = self.board.edge_ends
+        boundary = sorted(
+            e
+            for v in loop
+            for e in around[4 * v : 4 * v + 4]
+            if e and ends[2 * e] + ends[2 * e + 1] - v not in loop
+        )
+        used = self._new_var()
+
+        return [[-used] + boundary] + [[-edge, used] for edge in sorted(inner)]
+
+    def _inner_edges(self, loop: AbstractSet[int]) -> FrozenSet[int]:
+        around = self.board.node_edges
+        ends = self.board.edge_ends
+
+        return frozenset(
+            e
+            for v in loop
+            for e in around[4 * v : 4 * v + 4]
+            if e and ends[2 * e] + ends[2 * e + 1] - v in loop
+        )
+
+    def _covers_clues(self, edges: FrozenSet[int]) -> bool:
+        return all(
+            cell.value <= 0 or not cell.edges().isdisjoint(edges)
+            for row in self.board.cells
+            for cell in row
+        )
+
+    def _satisfies_clues(self, edges: FrozenSet[int]) -> bool:
+        return all(
+            cell.value < 0 or len(cell.edges() & edges) == cell.value
+            for row in self.board.cells
+            for cell in row
+        )
+
+    def extract_loops(self, models) -> List[List[int]]:
+        """The loops formed by the edges of `models`, each one as its node ids in
+        order along the loop. A component that is not closed comes as the path
+        walked from its first edge."""
+        edges = frozenset(x for x in models if 0 < x <= self.edges_count)
+        around = self.board.node_edges
+        ends = self.board.edge_ends
+        seen = set()
+        loops = []
+
+        for first in sorted(edges):
+            if first in seen:
+                continue
+
+            seen.add(first)
+            start, node = ends[2 * first], ends[2 * first + 1]
+            loop = [start]
+            while node != start:
+                loop.append(node)
+                edge = next(
+                    (
+                        e
+                        for e in around[4 * node : 4 * node + 4]
+                        if e in edges and e not in seen
+                    ),
+                    0,
+                )
+                if not edge:
+                    break
 
-            self.hint_clauses.append([-x for x in hints])
-            all_visisted.update(visited)
-            start = get_start()
+                seen.add(edge)
+                node = ends[2 * edge] + ends[2 * edge + 1] - node
+            loops.append(loop)
 
         return loops
 
     def assign_edges_index(self):
-        m = self.board.rows
-        n = self.board.columns
-        cells = self.board.cells
-        nodes = self.board.nodes
+        # the cells and nodes of the board carry their edge ids, extra variables
+        # are allocated after the edges
+        self.edges_count = self.board.edges_count
+        self.top_var = self.edges_count
 
-        for i in range(m):
-            for j in range(n):
-                cells[i][j].top = i * n + j + 1
-                cells[i][j].bottom = (i + 1) * n + j + 1
-                cells[i][j].left = (m + 1) * n + j * m + i + 1
-                cells[i][j].right = (m + 1) * n + (j + 1) * m + i + 1
+    def _new_var(self) -> int:
+        self.top_var += 1
+        return self.top_var
 
-        for i in range(m + 1):
-            for j in range(n + 1):
-                nodes[i][j].left = i * n + j if j > 0 else 0
-                nodes[i][j].right = i * n + j + 1 if j < n else 0
-                nodes[i][j].top = (m + 1) * n + j * m + i if i > 0 else 0
-                nodes[i][j].bottom = (m + 1) * n + j * m + i + 1 if i < m else 0
-
-    def encode_rules(self):
+    def encode_rules(self, fixed: List[int] = ()):
+        """CNF of the board, `fixed` are edge literals known before solving."""
         self.contraints = (
             self._cell_contraints()
             + self._node_contraints()
             + self._corners_rules()
             + self._break_smalloop()
         )
+        if self.mode == "connectivity":
+            self.contraints += self._connectivity_rules()
+
+        if self.presolve:
+            self.contraints = simplify(self.contraints, fixed)
+            self.contraints += [[x] for x in fixed]
+
+            return self.contraints
 
         tmp = self._heuristic_rules()
         for cnf in tmp:
@@ -188,69 +710,23 @@ class MySolver:
 
         return self.contraints
 
-    @cache
-    def do_extract_solution(self, model: FrozenSet[int]):
-        nodes = self.board.nodes
-        m = self.board.rows
-        n = self.board.columns
-
-        graph = defaultdict(list)
-        for i in range(m):
-            for j in range(n):
-                top = i * n + j + 1
-                bottom = (i + 1) * n + j + 1
-                left = (m + 1) * n + j * m + i + 1
-                right = (m + 1) * n + (j + 1) * m + i + 1
-
-                if top in model:
-                    graph[nodes[i][j]].append(nodes[i][j + 1])
-                    graph[nodes[i][j + 1]].append(nodes[i][j])
-
-                if bottom in model:
-                    graph[nodes[i + 1][j]].append(nodes[i + 1][j + 1])
-                    graph[nodes[i + 1][j + 1]].append(nodes[i + 1][j])
-                    pass
-                if left in model:
-                    graph[nodes[i][j]].append(nodes[i + 1][j])
-                    graph[nodes[i + 1][j]].append(nodes[i][j])
-                    pass
-                if right in model:
-                    graph[nodes[i][j + 1]].append(nodes[i + 1][j + 1])
-                    graph[nodes[i + 1][j + 1]].append(nodes[i][j + 1])
-                    pass
-        return graph
-
     def _extract_solution(self, model: List[int]):
-        clean_model = frozenset(x for x in model if x > 0)
-        self.board.graph = self.do_extract_solution(clean_model)
+        with self._phase("extract"):
+            clean_model = frozenset(x for x in model if 0 < x <= self.edges_count)
+            if self.solution:
+                # consecutive models share most edges, only write the changes
+                self.board.update_solution(
+                    clean_model - self.solution, self.solution - clean_model
+                )
+            else:
+                self.board.set_solution(clean_model)
+            self.solution = clean_model
 
     def _cell_contraints(self):
-        atmosts = [zero, one, two, three]
-        constraints = []
-        for i in range(self.board.rows):
-            for j in range(self.board.columns):
-                cell = self.board.cells[i][j]
-                if cell.value == -1:
-                    cnf = [[-cell.top, -cell.bottom, -cell.left, -cell.right]]
-                    constraints.extend(cnf)
-                    continue
-                else:
-                    cnf = atmosts[cell.value](
-                        cell.top, cell.bottom, cell.left, cell.right
-                    )
-
-                    constraints.extend(cnf)
-        return constraints
+        return cell_clauses(self.board)
 
     def _node_contraints(self):
-        constraints = []
-        for i in range(self.board.rows + 1):
-            for j in range(self.board.columns + 1):
-                node = self.board.nodes[i][j]
-                e1, e2, e3, e4 = [node.top, node.right, node.bottom, node.left]
-                constraints.extend(zero_or_two(e1, e2, e3, e4))
-
-        return constraints
+        return shape_clauses(self.board.rows, self.board.columns)[0]
 
     def _heuristic_rules(self):
         """Dù có cho bao nhiêu luật đi nữa hiệu quả vẫn không tăng"""
@@ -269,99 +745,90 @@ class MySolver:
         pass
 
     def _break_smalloop(self):
-        contraints = []
+        return shape_clauses(self.board.rows, self.board.columns)[1]
+
+    def _connectivity_rules(self):
+        """Force the used edges into one loop.
+
+        Every used node except a single root picks a parent along one of its used
+        edges, and a parent always has a smaller rank (a binary number over `bits`
+        variables). Ranks can not decrease forever, so following the parents from
+        any used node ends at the root, i.e. all used nodes are connected.
+        The root is the first used node in row-major order, which removes the
+        freedom of picking it.
+        """
         m = self.board.rows
         n = self.board.columns
+        nodes = self.board.nodes
+        bits = ((m + 1) * (n + 1)).bit_length()
 
-        top = lambda i, j: i * n + j + 1
-        bottom = lambda i, j: (i + 1) * n + j + 1
-        left = lambda i, j: (m + 1) * n + j * m + i + 1
-        right = lambda i, j: (m + 1) * n + (j + 1) * m + i + 1
-
-        loops = [
-            lambda i, j: (
-                [
-                    top(i, j),
-                    bottom(i, j),
-                    left(i, j),
-                    top(i, j + 1),
-                    bottom(i, j + 1),
-                    right(i, j + 1),
-                ],
-                j < n - 1,
-            ),
-            lambda i, j: (
-                [
-                    top(i, j),
-                    left(i, j),
-                    right(i, j),
-                    bottom(i + 1, j),
-                    left(i + 1, j),
-                    right(i + 1, j),
-                ],
-                i < m - 1,
-            ),
-            lambda i, j: (
-                [
-                    top(i, j),
-                    left(i, j),
-                    top(i, j + 1),
-                    right(i, j + 1),
-                    bottom(i, j + 1),
-                    left(i + 1, j),
-                    right(i + 1, j),
-                    bottom(i + 1, j),
-                ],
-                i < m - 1 and j < n - 1,
-            ),
-            lambda i, j: (
-                [
-                    top(i, j),
-                    left(i, j),
-                    right(i, j),
-                    left(i + 1, j),
-                    bottom(i + 1, j),
-                    top(i + 1, j + 1),
-                    right(i + 1, j + 1),
-                    bottom(i + 1, j + 1),
-                ],
-                i < m - 1 and j < n - 1,
-            ),
-            lambda i, j: (
-                [
-                    right(i, j),
-                    bottom(i, j),
-                    top(i, j + 1),
-                    right(i, j + 1),
-                    right(i + 1, j + 1),
-                    bottom(i + 1, j + 1),
-                    bottom(i + 1, j),
-                    left(i + 1, j),
-                ],
-                i < m - 1 and j < n - 1,
-            ),
-            lambda i, j: (
-                [
-                    left(i, j),
-                    top(i, j),
-                    bottom(i, j),
-                    top(i, j + 1),
-                    right(i, j + 1),
-                    right(i + 1, j + 1),
-                    bottom(i + 1, j + 1),
-                    left(i + 1, j + 1),
-                ],
-                i < m - 1 and j < n - 1,
-            ),
-        ]
-        for i in range(self.board.rows):
-            for j in range(self.board.columns):
-                for loop in loops[:1]:
-                    cnf, useable = loop(i, j)
-                    if not useable:
-                        continue
+        ranks = [[[self._new_var() for _ in range(bits)] for _ in row] for row in nodes]
+        contraints = []
+        roots = []
+        seen = 0
+
+        for i in range(m + 1):
+            for j in range(n + 1):
+                node = nodes[i][j]
+                neighbors = [
+                    (node.top, i - 1, j),
+                    (node.right, i, j + 1),
+                    (node.bottom, i + 1, j),
+                    (node.left, i, j - 1),
+                ]
+                neighbors = [(e, x, y) for e, x, y in neighbors if e]
+                edges = [e for e, _, _ in neighbors]
+
+                # root is a used node and no used node comes before it
+                root = self._new_var()
+                roots.append(root)
+                contraints.append([-root] + edges)
+                if seen:
+                    contraints.append([-root, -seen])
+
+                # seen: some node up to this one (row-major) is used
+                next_seen = self._new_var()
+                if seen:
+                    contraints.append([-seen, next_seen])
+                contraints.extend([-e, next_seen] for e in edges)
+                seen = next_seen
+
+                parents = []
+                for e, x, y in neighbors:
+                    parent = self._new_var()
+                    parents.append(parent)
+                    contraints.append([-parent, e])
+                    contraints.extend(self._less_than(parent, ranks[x][y], ranks[i][j]))
+
+                contraints.extend([-e, root] + parents for e in edges)
+
+                # redundant, but cuts the search: one parent at most, the root has
+                # none and its rank is zero
+                contraints.extend(
+                    [-p, -q] for k, p in enumerate(parents) for q in parents[k + 1 :]
+                )
+                contraints.extend([-root, -p] for p in parents)
+                contraints.extend([-root, -r] for r in ranks[i][j])
+
+        # the loop is not empty
+        contraints.append(roots)
 
-                    contraints.extend([[-x for x in cnf]])
+        return contraints
+
+    def _less_than(self, guard: int, a: List[int], b: List[int]):
+        """guard implies a < b, a and b are little-endian bit vectors."""
+        contraints = []
+        lower = 0
+        for k in range(len(a)):
+            less = guard if k == len(a) - 1 else self._new_var()
+            if lower:
+                contraints.append([-less, -a[k], b[k]])
+                contraints.append([-less, a[k], b[k], lower])
+                contraints.append([-less, -a[k], -b[k], lower])
+            else:
+                contraints.append([-less, -a[k]])
+                contraints.append([-less, b[k]])
+            lower = less
 
         return contraints
 
@@ -501,93 +968,3 @@ class MySolver:
                 pass
 
         return contraints
-
-
-def zero(e1, e2, e3, e4):
-    """
-    All e1, e2, e3 and e4 must be false.
-    """
-    return [[-e1], [-e2], [-e3], [-e4]]
-
-
-def one(e1, e2, e3, e4):
-    """
-    The "exactly one" constraint can be expressed as
-    * Amongst any two of booleans, at least one must be false.
-    * Atleast one of the booleans is true.
-    """
-    return [
-        [-e1, -e2],
-        [-e1, -e3],
-        [-e1, -e4],
-        [-e2, -e3],
-        [-e2, -e4],
-        [-e3, -e4],
-        [e1, e2, e3, e4],
-    ]
-
-
-def two(e1, e2, e3, e4):
-    """
-    Amongst any three booleans, at least one must be true,
-    and atleast one must be false.
-    """
-    return [
-        [e2, e3, e4],
-        [e1, e3, e4],
-        [e1, e2, e4],
-        [e1, e2, e3],
-        [-e2, -e3, -e4],
-        [-e1, -e3, -e4],
-        [-e1, -e2, -e4],
-        [-e1, -e2, -e3],
-    ]
-
-
-def three(e1, e2, e3, e4):
-    """
-    Amongst any two booleans, at least one must be true. This ensures
-    that there are at least three true booleans.
-    Also add a clause that ensures at least one of them must be false.
-    Together they ensure the "exactly three correct"
-    """
-    return [
-        [e1, e2],
-        [e1, e3],
-        [e1, e4],
-        [e2, e3],
-        [e2, e4],
-        [e3, e4],
-        [-e1, -e2, -e3, -e4],
-    ]
-
-
-def zero_or_two(e1, e2, e3, e4):
-    true = sys.maxsize
-    false = -true
-    edges = []
-    for item in [e1, e2, e3, e4]:
-        if item == 0:
-            edges.append(false)
-        else:
-            edges.append(item)
-    e1, e2, e3, e4 = edges
-    generic_contraints = [
-        [-e1, -e2, -e3],
-        [-e1, -e2, -e4],
-        [-e1, -e3, -e4],
-        [-e2, -e3, -e4],
-        [-e1, e2, e3, e4],
-        [e1, -e2, e3, e4],
-        [e1, e2, -e3, e4],
-        [e1, e2, e3, -e4],
-    ]
-
-    contraints = []
-    for row in generic_contraints:
-        if true in row:
-            continue
-
-        contraints.append([x for x in row if x != false])
-
-    return contraints
@@ -0,0 +1,198 @@
+"""Startup benchmark.
+
+Times cold starts of the command line tools and of the GUI, each in a fresh
+interpreter under `python -X importtime`, and reports the wall time, the import
+time and the slowest imports of every start, grouped by "cli" and "gui":
+
+    python src/startup.py -o startup.json
+    python src/startup.py --baseline startup.json --threshold 0.25
+
+A CLI start is `<tool> --help`, it must not load pysat, NumPy nor any GUI module.
+The GUI start imports main without opening the window, it must not load pysat
+or NumPy either, the first solve does. The run fails when a start loads one of those, or
+with a baseline, when a median got more than `threshold` slower.
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+SRC = Path(__file__).resolve().parent
+# name of the start -> (group, arguments of python)
+STARTS = {
+    **{
+        f"{tool} --help": ("cli", [tool, "--help"])
+        for tool in ["batch.py", "worker.py", "service.py", "store.py", "generator.py"]
+    },
+    "import main": ("gui", ["-c", "import main"]),
+}
+# top level packages a start must not import
+FORBIDDEN = {
+    "cli": {"pysat", "numpy", "tkinter", "PIL", "sv_ttk"},
+    "gui": {"pysat", "numpy"},
+}
+WARMUP = 1
+REPEAT = 10
+THRESHOLD = 0.25
+# medians faster than this (seconds) are too noisy to fail the run
+NOISE_FLOOR = 0.005
+SLOWEST = 10
+
+# import time:     self [us] | cumulative | imported package
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def parse_importtime(output: str) -> Tuple[float, List[Tuple[str, float]]]:
+    """Seconds spent importing, and (module, seconds) of its own for each module."""
+    total = 0
+    modules = []
+    for match in LINE.finditer(output):
+        own, cumulative, indent, name = match.groups()
+        modules.append((name, int(own) / 1e6))
+        if len(indent) == 1:
+            total += int(cumulative)
+
+    return total / 1e6, modules
+
+
+def time_start(args: List[str]) -> Tuple[float, float, List[Tuple[str, float]]]:
+    """(wall seconds, import seconds, modules) of one start."""
+    env = dict(os.environ)
+    # the bytecode of the warmup is what a real start finds
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    command = [sys.executable, "-X", "importtime", *args]
+
+    start = time.perf_counter()
+    done = subprocess.run(command, cwd=SRC, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if done.returncode != 0:
+        last = done.stderr.strip().splitlines()[-1:] or ["no output"]
+        raise RuntimeError(f"{' '.join(args)} failed: {last[0]}")
+
+    return (wall, *parse_importtime(done.stderr))
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    return {
+        "median": statistics.median(samples),
+        "min": min(samples),
+        "max": max(samples),
+    }
+
+
+def measure(group: str, args: List[str], warmup: int, repeat: int) -> Dict:
+    for _ in range(warmup):
+        time_start(args)
+
+    walls = []
+    imports = []
+    own = {}
+    for _ in range(repeat):
+        wall, total, modules = time_start(args)
+        walls.append(wall)
+        imports.append(total)
+        for name, seconds in modules:
+            own.setdefault(name, []).append(seconds)
+
+    medians = {name: statistics.median(values) for name, values in own.items()}
+    slowest = sorted(medians.items(), key=lambda item: -item[1])[:SLOWEST]
+    loaded = {name.split(".")[0] for name in own}
+
+    return {
+        "group": group,
+        "wall": summarize(walls),
+        "imports": summarize(imports),
+        "modules": len(own),
+        "slowest": [[name, seconds] for name, seconds in slowest],
+        "forbidden": sorted(loaded & FORBIDDEN[group]),
+    }
+
+
+def run(warmup: int = WARMUP, repeat: int = REPEAT, groups: List[str] = None) -> Dict:
+    starts = {}
+    for name, (group, args) in STARTS.items():
+        if groups and group not in groups:
+            continue
+        try:
+            starts[name] = measure(group, args, warmup, repeat)
+        except RuntimeError as error:
+            # the GUI needs tkinter, PIL and sv_ttk
+            starts[name] = {"group": group, "error": str(error)}
+
+    return {
+        "python": platform.python_version(),
+        "warmup": warmup,
+        "repeat": repeat,
+        "starts": starts,
+    }
+
+
+def problems(report: Dict, baseline: Dict = None, threshold: float = THRESHOLD):
+    """Starts that load a forbidden module, or got slower than the baseline."""
+    found = []
+    for name, start in report["starts"].items():
+        if start.get("forbidden"):
+            found.append(f"{name} loads {', '.join(start['forbidden'])}")
+        if baseline is None or "error" in start:
+            continue
+
+        for key in ["wall", "imports"]:
+            try:
+                before = baseline["starts"][name][key]["median"]
+            except KeyError:
+                continue
+
+            now = start[key]["median"]
+            if now > before * (1 + threshold) and now - before > NOISE_FLOOR:
+                found.append(
+                    f"{name} {key}: {before * 1000:.1f} ms -> {now * 1000:.1f} ms"
+                )
+
+    return found
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-g", "--group", nargs="*", choices=sorted(FORBIDDEN))
+    parser.add_argument("-w", "--warmup", type=int, default=WARMUP)
+    parser.add_argument("-r", "--repeat", type=int, default=REPEAT)
+    parser.add_argument("-o", "--output", help="JSON report (default: stdout)")
+    parser.add_argument("-b", "--baseline", help="JSON report to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=THRESHOLD,
+        help="allowed slowdown of a median, 0.25 is 25%%",
+    )
+    args = parser.parse_args(argv)
+
+    report = run(args.warmup, args.repeat, args.group)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+
+    found = problems(report, baseline, args.threshold)
+    for line in found:
+        print(f"startup: {line}", file=sys.stderr)
+
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
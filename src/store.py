@@ -0,0 +1,213 @@
+"""Packed binary puzzle files.
+
+A .bin file holds the same puzzles as the text file next to it, with each clue
+in 4 bits (clue + 1, 0 for no clue), two cells per byte. Puzzles are read
+through mmap and found by an offset index, so opening a file and reading one
+puzzle take the same time however many puzzles the file has.
+
+Layout, little-endian:
+
+    header   magic "SLPZ", version u32, count u64, index offset u64, size u64
+             and mtime u64 (ns) of the text file it was made from, 16 byte
+             blake2b digest of that text
+    records  rows u16, columns u16, (rows * columns + 1) // 2 bytes of clues
+    index    count u64 offsets of the records
+
+Convert the text files with:
+
+    python src/store.py data/*.txt [--dedupe]
+
+With --dedupe, the puzzles that are rotations or reflections of an earlier one
+are dropped, and the result goes to <name>.dedupe.bin instead. BoardRepository
+never reads it, so the indexes of the .bin and .txt files always agree.
+"""
+
+import argparse
+import mmap
+import os
+import struct
+from array import array
+from hashlib import blake2b
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, List, Tuple
+
+import symmetry
+from models import PuzzleSpec
+
+MAGIC = b"SLPZ"
+VERSION = 3
+HEADER = struct.Struct("<4sIQQQQ16s")
+SHAPE = struct.Struct("<HH")
+OFFSET = struct.Struct("<Q")
+# bytes read at once when hashing a text file
+CHUNK = 2**20
+
+# signed clue byte -> clue + 1, -1 (no clue) is 0
+_NIBBLE = bytes(b + 1 & 0xFF for b in range(256))
+# byte -> its low or high clue as a signed byte, -1 for no clue
+_LOW = bytes((b & 0xF) - 1 & 0xFF for b in range(256))
+_HIGH = bytes((b >> 4) - 1 & 0xFF for b in range(256))
+
+
+def pack_clues(clues: bytes) -> bytes:
+    """Clues as signed bytes (see PuzzleSpec) -> two per byte."""
+    values = clues.translate(_NIBBLE)
+    if len(values) % 2:
+        values += b"\0"
+
+    return bytes(a | b << 4 for a, b in zip(values[0::2], values[1::2]))
+
+
+def unpack_clues(data: bytes, count: int) -> bytes:
+    values = bytearray(2 * len(data))
+    values[0::2] = data.translate(_LOW)
+    values[1::2] = data.translate(_HIGH)
+
+    return bytes(values[:count])
+
+
+class PuzzleStore:
+    """A read-only .bin file, puzzles are decoded one at a time on demand."""
+
+    def __init__(self, path: Path | str):
+        self.path = path
+        with open(path, "rb") as f:
+            # the mapping stays valid after the file is closed
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version = struct.unpack_from("<4sI", self.data)
+        if magic != MAGIC or version != VERSION:
+            self.data.close()
+            raise ValueError(f"not a version {VERSION} puzzle file: {path}")
+        header = HEADER.unpack_from(self.data)
+        _, _, self.count, self.index, self.source_size, self.source_mtime = header[:6]
+        self.source = header[6]
+
+    def made_from(self, path: Path | str) -> bool:
+        """Whether this file was converted from the text file at `path`, as it is
+        now. Its size and mtime settle it, the text is only hashed when just the
+        mtime changed, e.g. after a checkout."""
+        st = os.stat(path)
+        if st.st_size != self.source_size:
+            return False
+        if st.st_mtime_ns == self.source_mtime:
+            return True
+
+        return source_digest(path) == self.source
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> PuzzleSpec:
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+
+        (offset,) = OFFSET.unpack_from(self.data, self.index + index * OFFSET.size)
+        rows, columns = SHAPE.unpack_from(self.data, offset)
+        start = offset + SHAPE.size
+        data = self.data[start : start + (rows * columns + 1) // 2]
+
+        return PuzzleSpec(rows, columns, unpack_clues(data, rows * columns))
+
+    def __iter__(self) -> Iterator[PuzzleSpec]:
+        for index in range(self.count):
+            yield self[index]
+
+    def close(self):
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def write_store(
+    path: Path | str,
+    puzzles: Iterable[PuzzleSpec],
+    source: Tuple[int, int, bytes] = (0, 0, bytes(16)),
+) -> int:
+    """Writes `puzzles` as a .bin file, returns how many.
+
+    `source` is the size, mtime (ns) and digest of the text file they come from,
+    see PuzzleStore.made_from.
+    """
+    tmp = Path(f"{path}.{os.getpid()}.tmp")
+    offsets = array("Q")
+    with open(tmp, "wb") as f:
+        f.write(bytes(HEADER.size))
+        for puzzle in puzzles:
+            offsets.append(f.tell())
+            f.write(SHAPE.pack(puzzle.rows, puzzle.columns))
+            f.write(pack_clues(puzzle.clues))
+
+        index = f.tell()
+        _write_offsets(f, offsets)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, len(offsets), index, *source))
+    os.replace(tmp, path)
+
+    return len(offsets)
+
+
+def _write_offsets(f: BinaryIO, offsets: array):
+    if struct.pack("=Q", 1) != OFFSET.pack(1):
+        offsets.byteswap()
+    offsets.tofile(f)
+
+
+def source_digest(path: Path | str) -> bytes:
+    """Digest of a text puzzle file, read CHUNK bytes at a time."""
+    digest = blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK):
+            digest.update(chunk)
+
+    return digest.digest()
+
+
+def store_path(path: Path | str) -> Path:
+    """The .bin file of a text puzzle file."""
+    return Path(path).with_suffix(".bin")
+
+
+def dedupe_path(path: Path | str) -> Path:
+    """The .bin file of a text puzzle file without its rotations and reflections."""
+    return Path(path).with_suffix(".dedupe.bin")
+
+
+def convert(path: Path | str, dedupe: bool = False) -> int:
+    """Writes the .bin file of a text puzzle file, returns the puzzle count.
+
+    With `dedupe`, only the first of the puzzles that are rotations or
+    reflections of each other is kept, in the file of dedupe_path.
+    """
+    # stat first: a text written meanwhile no longer matches what is recorded
+    st = os.stat(path)
+    source = (st.st_size, st.st_mtime_ns, source_digest(path))
+    output = dedupe_path(path) if dedupe else store_path(path)
+    with open(path, "r") as f:
+        puzzles = (PuzzleSpec.parse(line) for line in f if line.strip())
+        if dedupe:
+            puzzles = symmetry.dedupe(puzzles)
+
+        return write_store(output, puzzles, source)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="+", help="text puzzle files")
+    parser.add_argument(
+        "--dedupe", action="store_true", help="drop rotations and reflections"
+    )
+    args = parser.parse_args(argv)
+
+    for path in args.files:
+        count = convert(path, args.dedupe)
+        output = dedupe_path(path) if args.dedupe else store_path(path)
+        print(f"{output}: {count} puzzles")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Rotations and reflections of puzzles.
+
+A transform maps the cell (i, j) of a board to another cell of a board of the
+same or the swapped shape. Square boards have 8 of them, other boards only the
+4 that keep their shape. The canonical form of a puzzle is its transform with
+the smallest clues, so all rotations and reflections of a puzzle share it, and
+an answer of the canonical form can be moved back onto each of them with the
+edge maps.
+"""
+
+from array import array
+from functools import lru_cache
+from operator import itemgetter
+from typing import Callable, FrozenSet, Iterable, Iterator, List, Tuple
+
+from models import PuzzleSpec
+
+# (i, j) of a rows x columns grid -> (i, j) after the transform
+TRANSFORMS: List[Callable[[int, int, int, int], Tuple[int, int]]] = [
+    lambda i, j, m, n: (i, j),
+    # a quarter turn clockwise
+    lambda i, j, m, n: (j, m - 1 - i),
+    lambda i, j, m, n: (m - 1 - i, n - 1 - j),
+    lambda i, j, m, n: (n - 1 - j, i),
+    # mirrors left to right, then top to bottom
+    lambda i, j, m, n: (i, n - 1 - j),
+    lambda i, j, m, n: (m - 1 - i, j),
+    # mirrors along the diagonals
+    lambda i, j, m, n: (j, i),
+    lambda i, j, m, n: (n - 1 - j, m - 1 - i),
+]
+# the transforms that swap rows and columns
+SWAPPED = {1, 3, 6, 7}
+# clues compared before a transform is built in full, see canonical
+PREFIX = 24
+
+
+def transforms(rows: int, columns: int) -> List[int]:
+    """The transforms that keep the shape of the board."""
+    if rows == columns:
+        return list(range(len(TRANSFORMS)))
+
+    return [t for t in range(len(TRANSFORMS)) if t not in SWAPPED]
+
+
+def shape_of(rows: int, columns: int, t: int) -> Tuple[int, int]:
+    return (columns, rows) if t in SWAPPED else (rows, columns)
+
+
+@lru_cache(maxsize=256)
+def _order(rows: int, columns: int, t: int) -> List[int]:
+    """Cell of the board at each cell of the transformed board."""
+    m2, n2 = shape_of(rows, columns, t)
+    order = [0] * (rows * columns)
+    for i in range(rows):
+        for j in range(columns):
+            x, y = TRANSFORMS[t](i, j, rows, columns)
+            order[x * n2 + y] = i * columns + j
+
+    return order
+
+
+@lru_cache(maxsize=256)
+def _cells(rows: int, columns: int, t: int, count: int = None) -> Callable:
+    """Picks the first `count` clues of the transformed board out of the clues
+    of the board, all of them by default."""
+    order = _order(rows, columns, t)[:count]
+    if len(order) == 1:
+        return lambda clues: (clues[order[0]],)
+
+    return itemgetter(*order)
+
+
+@lru_cache(maxsize=256)
+def edge_map(rows: int, columns: int, t: int) -> array:
+    """Edge id of the board -> edge id of its transform, index 0 is unused.
+
+    Edge ids are those of MySolver.assign_edges_index (see Board.edges_count),
+    on both boards.
+    """
+    m = rows
+    n = columns
+    m2, n2 = shape_of(rows, columns, t)
+
+    def edge(a, b):
+        # the edge between two nodes of the transformed board
+        (i1, j1), (i2, j2) = sorted([a, b])
+        if i1 == i2:
+            return i1 * n2 + j1 + 1
+        return (m2 + 1) * n2 + j1 * m2 + i1 + 1
+
+    def node(i, j):
+        # a node grid is a (m + 1) x (n + 1) grid of its own
+        return TRANSFORMS[t](i, j, m + 1, n + 1)
+
+    mapping = array("i", [0])
+    for i in range(m + 1):
+        for j in range(n):
+            mapping.append(edge(node(i, j), node(i, j + 1)))
+    for j in range(n + 1):
+        for i in range(m):
+            mapping.append(edge(node(i, j), node(i + 1, j)))
+
+    return mapping
+
+
+@lru_cache(maxsize=256)
+def inverse_edge_map(rows: int, columns: int, t: int) -> array:
+    """Edge id of the transform -> edge id of the board."""
+    mapping = edge_map(rows, columns, t)
+    inverse = array("i", [0]) * len(mapping)
+    for e in range(1, len(mapping)):
+        inverse[mapping[e]] = e
+
+    return inverse
+
+
+def transform(spec: PuzzleSpec, t: int) -> PuzzleSpec:
+    rows, columns = shape_of(spec.rows, spec.columns, t)
+    clues = bytes(_cells(spec.rows, spec.columns, t)(spec.clues))
+
+    return PuzzleSpec(rows, columns, clues)
+
+
+def canonical(spec: PuzzleSpec) -> Tuple[PuzzleSpec, int]:
+    """The canonical form of the puzzle and the transform that gives it.
+
+    The first clues of every transform settle most of the comparisons, only the
+    transforms that tie on them are built in full.
+    """
+    m = spec.rows
+    n = spec.columns
+    prefixes = [(_cells(m, n, t, PREFIX)(spec.clues), t) for t in transforms(m, n)]
+    smallest = min(prefixes)[0]
+    ties = [t for prefix, t in prefixes if prefix == smallest]
+
+    found = None
+    best = 0
+    for t in ties:
+        other = spec if t == 0 else transform(spec, t)
+        if found is None or other.clues < found.clues:
+            found = other
+            best = t
+
+    return found, best
+
+
+def to_canonical(edges: Iterable[int], spec: PuzzleSpec, t: int) -> FrozenSet[int]:
+    """Edges of the puzzle -> edges of its canonical form, `t` from canonical."""
+    mapping = edge_map(spec.rows, spec.columns, t)
+    return frozenset(mapping[e] for e in edges)
+
+
+def from_canonical(edges: Iterable[int], spec: PuzzleSpec, t: int) -> FrozenSet[int]:
+    """Edges of the canonical form -> edges of the puzzle, `t` from canonical."""
+    inverse = inverse_edge_map(spec.rows, spec.columns, t)
+    return frozenset(inverse[e] for e in edges)
+
+
+def dedupe(specs: Iterable[PuzzleSpec]) -> Iterator[PuzzleSpec]:
+    """The first of each group of puzzles that are transforms of each other.
+
+    Keeps a 16 byte fingerprint per group.
+    """
+    seen = set()
+    for spec in specs:
+        key = canonical(spec)[0].fingerprint
+        if key not in seen:
+            seen.add(key)
+            yield spec
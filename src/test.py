@@ -1,4 +1,4 @@
-from solver import zero_or_two
+from encoding import zero_or_two
 
 
 ans = zero_or_two(-1, 2, 3, -1)
@@ -1,10 +1,11 @@
-import inspect
 import pathlib
-from models import Board, Cell
+from models import Board
 import time
 
 
 def DEBUG(*args, **kwargs):
+    import inspect
+
     cf = inspect.currentframe()
     cwd = pathlib.Path.cwd()
     filename = pathlib.Path(inspect.stack()[1].filename)
@@ -33,9 +34,4 @@ def sample_board():
         [3, -1, 3, 3, -1],
     ]
 
-    cells = [
-        [Cell(value=val, row=i, column=j) for j, val in enumerate(row_vals)]
-        for i, row_vals in enumerate(cell_vals)
-    ]
-
-    return Board(size, size, cells)
+    return Board(size, size, [val for row_vals in cell_vals for val in row_vals])
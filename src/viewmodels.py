@@ -1,15 +1,71 @@
-from models import Board
+from models import Board, PuzzleSpec
 from solver import MySolver, Statistics
 from typing import List, Callable
 from repository import BoardRepository
+from cache import SolutionCache
 import random
-from collections import defaultdict
-from threading import Thread, Event
+import time
+from threading import Thread, Event, Lock
+
+
+class FrameSlot:
+    """Hands the models of a solve from the solver thread to the UI thread.
+
+    It keeps only the latest one, a newer model replaces it, so the solver never
+    waits for the drawing. The replaced ones are dropped frames. Every solve has a
+    slot of its own, what an older solve puts in its slot is never shown.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.board = None
+        self.stats = None
+        self.done = None
+        self.models = 0
+        self.frames = 0
+        self.dropped = 0
+        self.start = time.perf_counter()
+        self.end = None
+
+    def put(self, board: Board, stats: Statistics):
+        # the solver keeps changing both, the stats shown need no loops history
+        board = board.deep_copy()
+        stats = stats.snapshot()
+        with self.lock:
+            if self.board is not None:
+                self.dropped += 1
+            self.board = board
+            self.stats = stats
+            self.models += 1
+
+    def finish(self, board: Board, stats: Statistics, done_callback: Callable):
+        with self.lock:
+            if self.board is not None:
+                self.dropped += 1
+            self.board = None
+            self.done = (board, stats, done_callback)
+            self.end = time.perf_counter()
+
+    def take(self):
+        """(board, stats, done) waiting for the UI, each None when there is none."""
+        with self.lock:
+            board, stats, done = self.board, self.stats, self.done
+            self.board = None
+            self.done = None
+            if board is not None:
+                self.frames += 1
+
+        return board, stats, done
+
+    @property
+    def models_per_second(self) -> float:
+        elapsed = (self.end or time.perf_counter()) - self.start
+        return self.models / elapsed if elapsed > 0 else 0
 
 
 class BoardViewModel:
     board: Board
-    puzzles: List[Board]
+    spec: PuzzleSpec
     subcribers: List[Callable]
 
     stats: Statistics
@@ -18,15 +74,26 @@ class BoardViewModel:
     DIFFICULTY = ["normal", "hard"]
     NO_PUZZLES = ["Random"] + [str(i + 1) for i in range(10)]
     ANIMATION = [True, False]
-
-    def __init__(self, repo: BoardRepository, board: Board = None):  # type: ignore
+    MODES = MySolver.MODES
+    # frames per second of the animation, see poll_frames
+    FPS = 30
+
+    def __init__(
+        self,
+        repo: BoardRepository,
+        board: Board = None,  # type: ignore
+        cache: SolutionCache = None,
+    ):
         self.repo = repo
+        # answers of earlier solves, a solve with animation skips it
+        self.cache = cache
         self.board = board
+        self.spec = PuzzleSpec.of(board) if board else None
 
         self.board_subcribers = []
         self.graph_subcribers = []
-        self.puzzles = repo.find_all(size="5x5", diff="normal")
         self.stats = Statistics()
+        self.frames = FrameSlot()
 
     def add_board_changed_callback(self, callback):
         self.board_subcribers.append(callback)
@@ -50,47 +117,66 @@ class BoardViewModel:
         assert difficulty in BoardViewModel.DIFFICULTY
         assert index in BoardViewModel.NO_PUZZLES
 
-        columns, rows = [int(x) for x in size.split("x")]
-        candiates = self.repo.find_all(size=size, diff=difficulty)
-
         if index == "Random":
-            index = random.randint(0, len(candiates) - 1)
+            index = random.randint(0, self.repo.count(size, difficulty) - 1)
         else:
             index = int(index) - 1
 
-        self.board = candiates[index]
-        self.board.graph = defaultdict(list)
-        self.board.solved = False
+        self.spec = self.repo.find_one(size, difficulty, index)
+        self.board = self.spec.to_board()
         self.stats.reset()
 
         self.board_changed()
 
     def do_solve(
-        self, done_callback: Callable = None, animation=False, cancel: Event = None
+        self,
+        done_callback: Callable = None,
+        animation=False,
+        cancel: Event = None,
+        mode: str = "lazy",
+        frames: FrameSlot = None,
     ):
-        def update_ui(board: Board, stats: Statistics):
-            self.board = board
-            self.stats = solver.stats
-            self.graph_changed()
-            # time.sleep(0.5)
-
-        solver = MySolver(board=self.board, cancel_event=cancel)
+        """Runs on its own thread, the UI gets the models and the answer through
+        `frames`, see poll_frames."""
+        frames = frames or self.frames
+        # the solver works on a board of its own, the shown one is replaced
+        solver = MySolver(
+            board=self.spec,
+            cancel_event=cancel,
+            mode=mode,
+            cache=None if animation else self.cache,
+        )
         if animation:
-            solver.add_partial_solution_callback(update_ui)
+            solver.add_partial_solution_callback(frames.put)
 
         completed_board = solver.solve()
-
-        done_callback()
-        if not animation:
-            self.stats = solver.stats
-            self.board = completed_board
+        # also after a cancel or timeout, so the last partial model goes away
+        frames.finish(completed_board, solver.stats, done_callback)
+
+    def poll_frames(self):
+        """Shows the latest model of the solve, or its answer once it is over.
+
+        Call it from the UI thread, FPS times a second.
+        """
+        board, stats, done = self.frames.take()
+        if done is not None:
+            self.board, self.stats, done_callback = done
+            done_callback()
             self.board_changed()
+        elif board is not None:
+            self.board = board
+            self.stats = stats
+            self.graph_changed()
 
-    def solve_board_cmd(self, done_callback: Callable = None, animation=False):
+    def solve_board_cmd(
+        self, done_callback: Callable = None, animation=False, mode: str = "lazy"
+    ):
         self.stop_solving = Event()
+        # a cancelled solve may still be running, it keeps its own slot
+        self.frames = FrameSlot()
         t = Thread(
             target=self.do_solve,
-            args=(done_callback, animation, self.stop_solving),
+            args=(done_callback, animation, self.stop_solving, mode, self.frames),
         )
         t.daemon = True
         t.start()
@@ -102,5 +188,5 @@ class BoardViewModel:
         done_callback()
 
     def _profile_solve(self):
-        solver = MySolver(self.board)
+        solver = MySolver(self.spec)
         solver.solve()
@@ -1,8 +1,7 @@
-import time
 import tkinter as tk
 from tkinter import font as tkfont
 from tkinter import ttk
-from typing import Tuple
+from typing import Set, Tuple
 
 import sv_ttk
 from PIL import Image, ImageTk
@@ -39,6 +38,13 @@ class Window(tk.Tk):
         self.viewmodel.add_graph_changed_callback(self.draw_graph)
         self.viewmodel.add_graph_changed_callback(self.controls.update_stats)
 
+        self.draw_frames()
+
+    def draw_frames(self):
+        """Shows what the solver thread left since the last frame."""
+        self.viewmodel.poll_frames()
+        self.after(1000 // BoardViewModel.FPS, self.draw_frames)
+
     def draw_graph(self):
         self.board.redraw_edges()
 
@@ -48,12 +54,17 @@ class Window(tk.Tk):
 
 class BoardFrame(ttk.Frame):
     TAGS = ["cells", "edges", "cells"]
+    LOOP_FILL = "#89B6A5"
+    # loops other than the first one, the answer is not found yet
+    EXTRA_FILL = "#e74c3c"
 
     def __init__(self, master, viewmodel: BoardViewModel):
         super().__init__(master, width=600, height=600)
         self.base_font = tkfont.Font(family="Arial", size=12)
 
         self.viewmodel = viewmodel
+        # canvas item of each edge id, made by redraw
+        self.edge_items = None
         self.canvas = tk.Canvas(
             self,
             bg="white",
@@ -79,57 +90,52 @@ class BoardFrame(ttk.Frame):
         pass
 
     def redraw_edges(self):
-        rows = self.viewmodel.board.rows
-        columns = self.viewmodel.board.columns
-
-        self.size = size = max(rows, columns) + 1
-        self.border_size = border_size = 4
-        self.canvas_size = canvas_size = self.canvas.winfo_width()
-        self.point_size = point_size = (canvas_size - 2 * border_size) / (8 * size - 7)
-        self.spacer = spacer = 7 * point_size
-        self.colors = ["#44222F", "#21300D", "#B4DC7F", "#3C3D00"]
-
-        self.font_size = font_size = min(int(spacer // 2), 48)
-        self.base_font.config(size=font_size)
-        self.font = self.base_font
-        self.canvas.delete("edges")
-
-        # time.sleep(0.4)
-
-        def get_start():
-            return next(
-                (
-                    node
-                    for node, neighbors in self.viewmodel.board.graph.items()
-                    if neighbors and node not in visited
-                ),
-                None,
-            )
-
-        def dfs(node, visited):
-            visited.append(node)
-            for neighbor in self.viewmodel.board.graph[node]:
-                if neighbor not in visited:
-                    self.draw_edge(node, neighbor, fill=fill)
-                    self.draw_edge(neighbor, node, fill=fill)
-                    time.sleep(0.01)
-
-                    dfs(neighbor, visited)
-
-        visited = list()
-        start = get_start()
-        one_loop = True
-        fill = "#89B6A5"
-
-        while start:
-            if not one_loop:
-                fill = "#e74c3c"
-
-            dfs(start, visited)
-            self.draw_edge(visited[-1], start, fill=fill)
-            visited.append(start)
-            start = get_start()
-            one_loop = False
+        """Shows the edges of the board, only the items of the edges that changed
+        since the last call are touched."""
+        board = self.viewmodel.board
+        if self.edge_items is None or len(self.edge_items) != board.edges_count + 1:
+            return self.redraw()
+
+        loop = self.first_loop(board)
+        # a byte per edge, the bits that differ are the edges turned on or off
+        diff = int.from_bytes(board.edges, "little") ^ int.from_bytes(
+            self.shown, "little"
+        )
+        digits = bin(diff)[:1:-1]
+        changed = set(loop ^ self.loop)
+        k = digits.find("1")
+        while k >= 0:
+            changed.add(k // 8)
+            k = digits.find("1", k + 1)
+
+        for e in changed:
+            if not board.edges[e]:
+                self.canvas.itemconfigure(self.edge_items[e], state=tk.HIDDEN)
+            else:
+                fill = self.LOOP_FILL if e in loop else self.EXTRA_FILL
+                self.canvas.itemconfigure(
+                    self.edge_items[e], state=tk.NORMAL, fill=fill
+                )
+
+        self.shown = board.edges[:]
+        self.loop = loop
+
+    def first_loop(self, board) -> Set[int]:
+        """Edge ids of the loop through the first edge of the answer, the others
+        are drawn as extra loops."""
+        around = board.node_edges
+        ends = board.edge_ends
+        edges = board.edges
+        loop = set()
+
+        e = edges.find(1, 1)
+        v = ends[2 * e] if e > 0 else 0
+        while e > 0 and e not in loop:
+            loop.add(e)
+            v = ends[2 * e] + ends[2 * e + 1] - v
+            e = next((f for f in around[4 * v : 4 * v + 4] if edges[f] and f != e), 0)
+
+        return loop
 
     def redraw(self, tags=TAGS):
         rows = self.viewmodel.board.rows
@@ -158,9 +164,16 @@ class BoardFrame(ttk.Frame):
         for x in range(columns):
             for y in range(rows):
                 self.draw_cell(x, y, cells)
-        for src, neighbors in self.viewmodel.board.graph.items():
-            for dest in neighbors:
-                self.draw_edge(src, dest)
+
+        # one hidden item per edge id, redraw_edges only shows and hides them
+        ends = self.viewmodel.board.edge_ends
+        self.edge_items = [0] + [
+            self.draw_edge(*self.node_at(ends[2 * e]), *self.node_at(ends[2 * e + 1]))
+            for e in range(1, self.viewmodel.board.edges_count + 1)
+        ]
+        self.shown = bytearray(len(self.edge_items))
+        self.loop = set()
+        self.redraw_edges()
 
     def draw_background(self):
         self.canvas.create_rectangle(
@@ -206,22 +219,30 @@ class BoardFrame(ttk.Frame):
             tags="nodes",
         )
 
-    def draw_edge(self, src, dest, fill="#89B6A5"):
-        y1 = src.row * (self.spacer + self.point_size) + self.border_size
-        x1 = src.column * (self.spacer + self.point_size) + self.border_size
+    def node_at(self, v: int) -> Tuple[int, int]:
+        """Row and column of a node id."""
+        return divmod(v, self.viewmodel.board.columns + 1)
 
-        y2 = (
-            dest.row * (self.spacer + self.point_size)
-            + self.border_size
-            + self.point_size
-        )
+    def draw_edge(self, row1, column1, row2, column2) -> int:
+        y1 = row1 * (self.spacer + self.point_size) + self.border_size
+        x1 = column1 * (self.spacer + self.point_size) + self.border_size
+
+        y2 = row2 * (self.spacer + self.point_size) + self.border_size + self.point_size
         x2 = (
-            dest.column * (self.spacer + self.point_size)
+            column2 * (self.spacer + self.point_size)
             + self.border_size
             + self.point_size
         )
-        self.canvas.create_rectangle(
-            x1, y1, x2, y2, fill=fill, outline="#0A2E36", tags="edges"
+
+        return self.canvas.create_rectangle(
+            x1,
+            y1,
+            x2,
+            y2,
+            fill=self.LOOP_FILL,
+            outline="#0A2E36",
+            state=tk.HIDDEN,
+            tags="edges",
         )
 
 
@@ -235,12 +256,16 @@ class ControlFrame(ttk.Frame):
         self.index = tk.StringVar()
         self.animation = tk.BooleanVar(value=False)
         self.animation.set(False)
+        self.mode = tk.StringVar()
 
         self.acum_time = tk.StringVar(value="0.000 ms")
         self.clauses = tk.StringVar(value="0")
         self.variables = tk.StringVar(value="0")
         self.retried = tk.StringVar(value="0")
         self.hints = tk.StringVar(value="0")
+        self.status = tk.StringVar(value="")
+        self.models_rate = tk.StringVar(value="0")
+        self.dropped = tk.StringVar(value="0")
 
         self.build_ui()
 
@@ -258,13 +283,16 @@ class ControlFrame(ttk.Frame):
         self.cancel_btn["state"] = tk.NORMAL
 
         animation = self.animation.get()
+        mode = self.mode.get()
 
         def done():
             self.new_btn["state"] = tk.NORMAL
             self.solve_btn["state"] = tk.NORMAL
             self.cancel_btn["state"] = tk.DISABLED
 
-        self.viewmodel.solve_board_cmd(done_callback=done, animation=animation)
+        self.viewmodel.solve_board_cmd(
+            done_callback=done, animation=animation, mode=mode
+        )
 
     def cancel(self):
         self.solve_btn["state"] = tk.DISABLED
@@ -284,7 +312,10 @@ class ControlFrame(ttk.Frame):
         self.variables.set(f"{self.viewmodel.stats.variables}")
         self.retried.set(f"{self.viewmodel.stats.retried}")
         self.hints.set(f"{self.viewmodel.board.hints}")
-        pass
+        self.status.set(self.viewmodel.stats.status)
+        frames = self.viewmodel.frames
+        self.models_rate.set(f"{frames.models_per_second:.1f}")
+        self.dropped.set(f"{frames.dropped} of {frames.models}")
 
     def build_ui(self):
         option_fr = ttk.Frame(self)
@@ -337,6 +368,18 @@ class ControlFrame(ttk.Frame):
         label12.pack(side=tk.LEFT, padx=4, pady=2)
         combox12.pack(side=tk.RIGHT, padx=2, pady=2, expand=True, fill=tk.X)
 
+        row13 = ttk.Frame(option_fr)
+        label13 = ttk.Label(row13, text="Mode", width=12)
+        combox13 = ttk.Combobox(
+            row13,
+            values=BoardViewModel.MODES,
+            state="readonly",
+            textvariable=self.mode,
+        )
+        combox13.current(0)
+        label13.pack(side=tk.LEFT, padx=4, pady=2)
+        combox13.pack(side=tk.RIGHT, padx=2, pady=2, expand=True, fill=tk.X)
+
         row2 = ttk.Frame(option_fr)
         label2 = ttk.Label(row2, text="Time", width=12)
         timelabel = ttk.Label(row2, text="0", textvariable=self.acum_time)
@@ -367,15 +410,37 @@ class ControlFrame(ttk.Frame):
         label6.pack(side=tk.LEFT, padx=4, pady=2)
         label6_val.pack(side=tk.RIGHT, padx=2, pady=2, expand=True, fill=tk.X)
 
+        row7 = ttk.Frame(option_fr)
+        label7 = ttk.Label(row7, text="Status", width=12)
+        label7_val = ttk.Label(row7, text="", textvariable=self.status)
+        label7.pack(side=tk.LEFT, padx=4, pady=2)
+        label7_val.pack(side=tk.RIGHT, padx=2, pady=2, expand=True, fill=tk.X)
+
+        row8 = ttk.Frame(option_fr)
+        label8 = ttk.Label(row8, text="Models/s", width=12)
+        label8_val = ttk.Label(row8, text="0", textvariable=self.models_rate)
+        label8.pack(side=tk.LEFT, padx=4, pady=2)
+        label8_val.pack(side=tk.RIGHT, padx=2, pady=2, expand=True, fill=tk.X)
+
+        row9 = ttk.Frame(option_fr)
+        label9 = ttk.Label(row9, text="Dropped", width=12)
+        label9_val = ttk.Label(row9, text="0", textvariable=self.dropped)
+        label9.pack(side=tk.LEFT, padx=4, pady=2)
+        label9_val.pack(side=tk.RIGHT, padx=2, pady=2, expand=True, fill=tk.X)
+
         row1.pack(side=tk.TOP, fill=tk.X, padx=2, pady=2)
         row10.pack(side=tk.TOP, fill=tk.X, padx=2, pady=2)
         row11.pack(side=tk.TOP, fill=tk.X, padx=2, pady=2)
         row12.pack(side=tk.TOP, fill=tk.X, padx=2, pady=2)
+        row13.pack(side=tk.TOP, fill=tk.X, padx=2, pady=2)
         row2.pack(side=tk.TOP, fill=tk.X, padx=2, pady=2)
         row3.pack(side=tk.TOP, fill=tk.X, padx=2, pady=2)
         row4.pack(side=tk.TOP, fill=tk.X, padx=2, pady=2)
         row5.pack(side=tk.TOP, fill=tk.X, padx=2, pady=2)
         row6.pack(side=tk.TOP, fill=tk.X, padx=2, pady=2)
+        row7.pack(side=tk.TOP, fill=tk.X, padx=2, pady=2)
+        row8.pack(side=tk.TOP, fill=tk.X, padx=2, pady=2)
+        row9.pack(side=tk.TOP, fill=tk.X, padx=2, pady=2)
         option_fr.pack(side=tk.TOP, fill=tk.X, padx=2, pady=2)
 
         spacer = ttk.Frame(self)
@@ -0,0 +1,219 @@
+"""Long-running solver for pipelines.
+
+Reads one puzzle per line from stdin, in the format of data/puzzle_*.txt or as
+JSON ({"id": ..., "puzzle": "5 5 ..."} or {"id": ..., "rows": 5, "columns": 5,
+"clues": [...]}), and writes one JSON line per puzzle to stdout:
+
+    {"id": ..., "status": "solved", "edges": [...], "stats": {...}}
+
+    python src/worker.py --jobs 8 < puzzles.txt > answers.ndjson
+
+The id is the one given, or the line number. Puzzles are solved on a pool of
+processes that stay up for the whole stream, at most `--inflight` at a time, and
+the answers come out as soon as they are ready, not in input order unless
+`--ordered`. An answer with status "error" carries the message of a line that is
+not a puzzle, or could not be solved, e.g. because its worker process died.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+from array import array
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict
+from typing import Any, Dict, IO, Iterable, List, Tuple
+
+from cache import SolutionCache
+from encoding import CELL_RULES
+from models import PuzzleSpec
+from solver import MySolver
+
+# puzzles read ahead of the answers, per worker process
+INFLIGHT_PER_JOB = 4
+
+# set in every worker process by _start
+_options = {}
+
+
+def parse_line(line: str, number: int) -> Tuple[Any, PuzzleSpec]:
+    """(id, PuzzleSpec) of an input line.
+
+    Raises ValueError, or KeyError and TypeError for JSON with missing or wrong
+    fields, when the line is not a puzzle.
+    """
+    key = number
+    if line.lstrip().startswith("{"):
+        item = json.loads(line)
+        if not isinstance(item, dict):
+            raise ValueError("not a JSON object")
+        key = item.get("id", number)
+        if "puzzle" in item:
+            rows, columns, *clues = [int(x) for x in item["puzzle"].split()]
+        else:
+            rows, columns, clues = item["rows"], item["columns"], item["clues"]
+    else:
+        rows, columns, *clues = [int(x) for x in line.split()]
+
+    if rows < 1 or columns < 1:
+        raise ValueError(f"{rows}x{columns} board")
+    if len(clues) != rows * columns:
+        raise ValueError(f"{len(clues)} clues for {rows}x{columns}")
+    wrong = set(clues) - CELL_RULES.keys()
+    if wrong:
+        raise ValueError(f"clues must be -1..3, got {sorted(wrong)}")
+
+    return key, PuzzleSpec(rows, columns, array("b", clues).tobytes())
+
+
+def _start(mode: str, timeout: float, cache: str):
+    _options.update(mode=mode, timeout=timeout)
+    _options["cache"] = SolutionCache(cache) if cache else None
+
+
+def _solve(key: Any, spec: PuzzleSpec) -> Dict:
+    solver = MySolver(
+        spec,
+        mode=_options["mode"],
+        timeout=_options["timeout"],
+        cache=_options["cache"],
+    )
+    solver.solve()
+    result = solver.result()
+
+    return {
+        "id": key,
+        "status": result.status,
+        "edges": sorted(result.edges),
+        "stats": asdict(result.stats),
+    }
+
+
+class Writer:
+    """Writes answers as they come, or in input order when `ordered`."""
+
+    def __init__(self, out: IO, ordered: bool, slots: threading.Semaphore):
+        self.out = out
+        self.ordered = ordered
+        self.slots = slots
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.next = 0
+
+    def __call__(self, seq: int, answer: Dict):
+        with self.lock:
+            if not self.ordered:
+                self._write(answer)
+                return
+
+            self.pending[seq] = answer
+            while self.next in self.pending:
+                self._write(self.pending.pop(self.next))
+                self.next += 1
+
+    def _write(self, answer: Dict):
+        try:
+            self.out.write(json.dumps(answer, separators=(",", ":")) + "\n")
+            self.out.flush()
+        finally:
+            self.slots.release()
+
+
+def run(
+    lines: Iterable[str],
+    out: IO,
+    jobs: int = None,
+    inflight: int = None,
+    ordered: bool = False,
+    mode: str = "lazy",
+    timeout: float = None,
+    cache: str = None,
+):
+    """Solves `lines` on `jobs` processes and writes the answers to `out`.
+
+    A slot is taken for every line and given back when its answer is written,
+    an error included, so at most `inflight` puzzles are read ahead. With
+    `ordered`, answers waiting for an earlier one keep their slot. Lines are
+    parsed here, only puzzles go to the pool. When a worker process dies, its
+    puzzles get an error and the next ones go to a new pool.
+    """
+    jobs = jobs or os.cpu_count()
+    inflight = inflight or jobs * INFLIGHT_PER_JOB
+    slots = threading.Semaphore(inflight)
+    writer = Writer(out, ordered, slots)
+
+    def start():
+        return ProcessPoolExecutor(
+            jobs, initializer=_start, initargs=(mode, timeout, cache)
+        )
+
+    pool = start()
+    try:
+        seq = 0
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+
+            slots.acquire()
+            try:
+                key, spec = parse_line(line, number)
+            except (ValueError, KeyError, TypeError) as error:
+                writer(seq, {"id": number, "status": "error", "error": str(error)})
+                seq += 1
+                continue
+
+            try:
+                future = pool.submit(_solve, key, spec)
+            except BrokenProcessPool:
+                # a worker process died, the puzzles it had were answered
+                pool.shutdown(wait=False)
+                pool = start()
+                future = pool.submit(_solve, key, spec)
+
+            def done(future: Future, seq=seq, key=key):
+                try:
+                    answer = future.result()
+                except Exception as error:
+                    answer = {"id": key, "status": "error", "error": repr(error)}
+                writer(seq, answer)
+
+            future.add_done_callback(done)
+            seq += 1
+    finally:
+        pool.shutdown(wait=True)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=os.cpu_count(), help="worker processes"
+    )
+    parser.add_argument(
+        "--inflight",
+        type=int,
+        help=f"puzzles read ahead (default: {INFLIGHT_PER_JOB} per job)",
+    )
+    parser.add_argument(
+        "--ordered", action="store_true", help="write answers in input order"
+    )
+    parser.add_argument("-m", "--mode", choices=MySolver.MODES, default="lazy")
+    parser.add_argument("-t", "--timeout", type=float, help="seconds per puzzle")
+    parser.add_argument("--cache", help="reuse known answers from this file")
+    args = parser.parse_args(argv)
+
+    run(
+        sys.stdin,
+        sys.stdout,
+        jobs=args.jobs,
+        inflight=args.inflight,
+        ordered=args.ordered,
+        mode=args.mode,
+        timeout=args.timeout,
+        cache=args.cache,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""encoding.py, its NumPy blocks against its cell by cell path.
+
+python -m unittest discover tests
+"""
+
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+import encoding  # noqa: E402
+from models import Board  # noqa: E402
+from repository import load_puzzles  # noqa: E402
+
+BOARDS = ["5x5 normal", "7x7 hard", "10x10 hard", "25x30 hard"]
+
+
+def boards():
+    for name in BOARDS:
+        yield load_puzzles(ROOT / "data" / f"puzzle_{name}.txt")[0].to_board()
+    # every clue, the shapes of one row or column
+    yield Board(3, 3, [-1, 0, 1, 2, 3, 0, 1, 2, 3])
+    yield Board(1, 4, [0, 1, 2, 3])
+    yield Board(4, 1, [3, 2, 1, -1])
+
+
+@unittest.skipUnless(encoding._numpy(), "NumPy is not installed")
+class BlocksTest(unittest.TestCase):
+    RULES = [encoding.cell_clauses, encoding.node_clauses, encoding.smalloop_clauses]
+
+    def test_same_clauses_in_the_same_order(self):
+        for board in boards():
+            for rule in self.RULES:
+                with self.subTest(board=(board.rows, board.columns), rule=rule):
+                    blocks = rule(board)
+                    with mock.patch.object(encoding, "np", False):
+                        plain = rule(board)
+
+                    self.assertEqual(blocks, plain)
+                    # plain ints, a SAT backend does not take NumPy integers
+                    self.assertTrue(
+                        all(type(x) is int for clause in blocks for x in clause)
+                    )
+
+
+class CellClausesTest(unittest.TestCase):
+    def test_wrong_clue(self):
+        board = Board(2, 2, [0, 1, 2, 3])
+        board.clues[0] = 4
+        with self.assertRaises(ValueError):
+            encoding.cell_clauses(board)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+"""Presolver against the CNF of MySolver.
+
+python -m unittest discover tests
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from models import Board  # noqa: E402
+from presolve import Presolver  # noqa: E402
+from solver import MySolver, Status  # noqa: E402
+
+# boards the presolver fixes completely, (rows, columns, clues) -> status
+SMALL_LOOPS = {
+    # the only loop goes around the middle cell
+    (3, 3, (0, 1, 0, 1, -1, 1, 0, 1, 0)): Status.UNSOLVABLE,
+    # around the two middle cells, side by side
+    (3, 4, (0, 1, 1, 0, 1, -1, -1, 1, 0, 1, 1, 0)): Status.UNSOLVABLE,
+    # the CNF only forbids the horizontal pair
+    (4, 3, (0, 1, 0, 1, -1, 1, 1, -1, 1, 0, 1, 0)): Status.SOLVED,
+}
+
+
+class SmallLoopTest(unittest.TestCase):
+    def test_presolve_agrees_with_the_cnf(self):
+        for (rows, columns, clues), status in SMALL_LOOPS.items():
+            with self.subTest(board=(rows, columns, clues)):
+                presolver = Presolver(Board(rows, columns, clues))
+                presolver.run()
+                self.assertEqual(presolver.contradiction, status != Status.SOLVED)
+
+                for presolve in [True, False]:
+                    solver = MySolver(Board(rows, columns, clues), presolve=presolve)
+                    solver.solve()
+                    self.assertEqual(solver.stats.status, status)
+
+
+if __name__ == "__main__":
+    unittest.main()
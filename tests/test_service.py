@@ -0,0 +1,123 @@
+"""SolveService through SolveClient, on a local port.
+
+python -m unittest discover tests
+"""
+
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from repository import load_puzzles  # noqa: E402
+from service import SolveClient, SolveService  # noqa: E402
+from solver import Status  # noqa: E402
+
+# seconds a test waits for a job
+WAIT = 60
+
+
+def puzzles(name: str):
+    return [spec.line() for spec in load_puzzles(ROOT / "data" / f"puzzle_{name}.txt")]
+
+
+class ServiceTest(unittest.IsolatedAsyncioTestCase):
+    # one worker process, so a second job waits in the queue
+    JOBS = 1
+    QUEUE = 2
+
+    async def asyncSetUp(self):
+        self.service = SolveService(self.JOBS, self.QUEUE)
+        _, port = await self.service.start(port=0)
+        self.client = SolveClient(port=port)
+        # slow enough to be still running when the test looks at it
+        self.slow = puzzles("25x30 hard")
+
+    async def asyncTearDown(self):
+        await self.service.close()
+
+    async def wait_for(self, job_id: int, statuses) -> dict:
+        async def poll():
+            while True:
+                job = await self.client.job(job_id)
+                if job["status"] in statuses:
+                    return job
+                await asyncio.sleep(0.05)
+
+        return await asyncio.wait_for(poll(), WAIT)
+
+    async def test_submit_then_poll(self):
+        job_id = await self.client.submit(puzzles("10x10 hard")[0])
+        self.assertIsNotNone(job_id)
+
+        job = await self.wait_for(job_id, [Status.SOLVED])
+        self.assertTrue(job["edges"])
+        self.assertEqual(job["stats"]["status"], Status.SOLVED)
+
+    async def test_duplicate_shares_the_job(self):
+        first = await self.client.submit(self.slow[0], mode="connectivity")
+        second = await self.client.submit(self.slow[0], mode="connectivity")
+        self.assertEqual(first, second)
+
+        # another mode or timeout is another job
+        other = await self.client.submit(self.slow[0], mode="lazy")
+        self.assertNotEqual(first, other)
+        other = await self.client.submit(self.slow[0], mode="connectivity", timeout=1)
+        self.assertNotEqual(first, other)
+
+    async def test_last_client_cancels(self):
+        job_id = await self.client.submit(self.slow[0], mode="connectivity")
+        await self.client.submit(self.slow[0], mode="connectivity")
+        await self.wait_for(job_id, ["running"])
+
+        # the other client still waits for it
+        job = await self.client.cancel(job_id)
+        self.assertEqual(job["status"], "running")
+        await asyncio.sleep(0.2)
+        self.assertEqual((await self.client.job(job_id))["status"], "running")
+
+        await self.client.cancel(job_id)
+        job = await self.wait_for(job_id, [Status.SOLVED, Status.CANCELLED])
+        self.assertEqual(job["status"], Status.CANCELLED)
+
+    async def test_full_queue(self):
+        for line in self.slow[: self.QUEUE]:
+            self.assertIsNotNone(await self.client.submit(line, mode="connectivity"))
+
+        status, body = await self.client.request(
+            "POST", "/jobs", {"puzzle": self.slow[self.QUEUE], "mode": "connectivity"}
+        )
+        self.assertEqual(status, 429)
+        self.assertIn("error", body)
+
+    async def test_cancel_running_job(self):
+        job_id = await self.client.submit(self.slow[0], mode="connectivity")
+        await self.wait_for(job_id, ["running"])
+
+        status, _ = await self.client.request("DELETE", f"/jobs/{job_id}")
+        self.assertEqual(status, 202)
+        job = await self.wait_for(job_id, [Status.SOLVED, Status.CANCELLED])
+        self.assertEqual(job["status"], Status.CANCELLED)
+
+    async def test_malformed_body(self):
+        status, _ = await self.client.request("POST", "/jobs", {"puzzle": "5 5 1 2"})
+        self.assertEqual(status, 400)
+        status, _ = await self.client.request("POST", "/jobs", {"rows": 5})
+        self.assertEqual(status, 400)
+        # JSON, but not an object
+        for payload in [[], 1, "5 5"]:
+            status, _ = await self.client.request("POST", "/jobs", payload)
+            self.assertEqual(status, 400)
+
+        # not JSON at all
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.client.port)
+        writer.write(b"POST /jobs HTTP/1.1\r\nContent-Length: 5\r\n\r\n{oops")
+        await writer.drain()
+        self.assertIn(b" 400 ", await reader.readline())
+        writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
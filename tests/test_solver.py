@@ -0,0 +1,94 @@
+"""MySolver on the puzzles of data/.
+
+python -m unittest discover tests
+"""
+
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from models import Board  # noqa: E402
+from repository import load_puzzles  # noqa: E402
+from solver import MySolver, Status  # noqa: E402
+
+
+def puzzles(name: str):
+    return load_puzzles(ROOT / "data" / f"puzzle_{name}.txt")
+
+
+class StopTest(unittest.TestCase):
+    def setUp(self):
+        # the connectivity encoding of it takes seconds on every backend
+        self.slow = puzzles("25x30 hard")[0]
+
+    def test_timeout_without_interrupt(self):
+        # cd19 can not interrupt a SAT call, it runs in slices of conflicts
+        start = time.perf_counter()
+        solver = MySolver(self.slow, mode="connectivity", backend="cd19", timeout=0.3)
+        solver.solve()
+
+        self.assertEqual(solver.stats.status, Status.TIMEOUT)
+        self.assertLess(time.perf_counter() - start, 2)
+        self.assertFalse(solver.board.solved)
+
+    def test_conflicts_without_interrupt(self):
+        solver = MySolver(self.slow, mode="connectivity", backend="cd19", conflicts=50)
+        solver.solve()
+
+        self.assertEqual(solver.stats.status, Status.BUDGET)
+        self.assertLessEqual(solver.stats.conflicts, 50)
+
+    def test_solves_while_polling(self):
+        solver = MySolver(puzzles("10x10 hard")[0], backend="cd19", timeout=60)
+        solver.solve()
+
+        self.assertEqual(solver.stats.status, Status.SOLVED)
+
+    def test_propagations_without_budget(self):
+        for backend in ["cd19", "lgl"]:
+            with self.assertRaises(ValueError):
+                MySolver(self.slow, backend=backend, propagations=1000)
+
+        solver = MySolver(self.slow, mode="connectivity", propagations=1000)
+        solver.solve()
+        self.assertEqual(solver.stats.status, Status.BUDGET)
+
+    def test_unstoppable_backend(self):
+        with self.assertRaises(ValueError):
+            MySolver(self.slow, backend="lgl", timeout=1)
+        with self.assertRaises(ValueError):
+            MySolver(self.slow, backend="lgl", conflicts=100)
+
+
+class CountTest(unittest.TestCase):
+    def test_unique(self):
+        solver = MySolver(puzzles("10x10 hard")[0])
+
+        self.assertEqual(solver.count_solutions(), 1)
+        self.assertEqual(solver.stats.status, Status.SOLVED)
+        self.assertTrue(solver.board.solved)
+        self.assertTrue(solver.result().edges)
+
+    def test_cancel_after_the_first_answer(self):
+        # without clues a 2x2 board has several answers and no model of two loops,
+        # the cancel comes with the first model of one loop
+        cancel = threading.Event()
+        solver = MySolver(Board(2, 2, [-1] * 4), cancel_event=cancel)
+        solver.add_event_callback(
+            lambda event: event.kind == "model" and event.loops == 1 and cancel.set()
+        )
+
+        self.assertEqual(solver.count_solutions(3), 1)
+        self.assertEqual(solver.stats.status, Status.CANCELLED)
+        self.assertFalse(solver.board.solved)
+        self.assertEqual(solver.solution, frozenset())
+        self.assertEqual(solver.result().edges, frozenset())
+
+
+if __name__ == "__main__":
+    unittest.main()